@@ -1,5 +1,6 @@
 from flask import (
     Flask,
+    abort,
     render_template,
     flash,
     redirect,
@@ -7,26 +8,116 @@ from flask import (
     send_file,
     session,
     jsonify,
+    Response,
+    stream_with_context,
 )
 from forms import LoteForm
 from logger_config import setup_logger
 from services.api import CGANService
+from services.archive import batch_folder, cached_zip, folder_signature, stream_zip
+from services.cache import ResponseCache
+from services.quota import QuotaScheduler, per_process_limits
+from services.transport import Transport
+from services.jobs import JobManager
+from services.lote_store import create_lote_store
+from services.metrics import metrics, render_gauge
+from services.pipeline import process_lote
 import logging
 import colorlog
+import threading
 import time
 import os
-import zipfile
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "tu_clave_secreta_aqui"
-
-storage = {"results_lote": [], "results_individuals": []}
+# Clients of a lote filled and exported at the same time (1 = sequential)
+app.config["CLIENT_WORKERS"] = int(os.environ.get("CLIENT_WORKERS", 4))
+# Lotes processed at the same time, the rest wait queued
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 2))
+# "sheets" fills the Google Sheets template. "local" (base.xlsx on disk)
+# evaluates no formulas, so its Consecutivos rows and PDFs would come out
+# empty: it is refused here
+app.config["EXCEL_BACKEND"] = os.environ.get("EXCEL_BACKEND", "sheets")
+if app.config["EXCEL_BACKEND"] != "sheets":
+    raise RuntimeError(
+        f"EXCEL_BACKEND={app.config['EXCEL_BACKEND']} can't process real lotes, "
+        "use EXCEL_BACKEND=sheets"
+    )
+# Seconds the lote number -> id map is reused before a full refresh
+app.config["BATCHES_TTL"] = int(os.environ.get("BATCHES_TTL", 600))
+# On-disk cache of INFOCGAN lote responses
+app.config["CACHE_DIR"] = os.environ.get("CACHE_DIR", "cache/infocgan")
+app.config["CACHE_MAX_BYTES"] = int(os.environ.get("CACHE_MAX_BYTES", 200 * 1024 * 1024))
+app.config["CACHE_MAX_AGE"] = int(os.environ.get("CACHE_MAX_AGE", 600))
+# INFOCGAN connection pool and retries of idempotent calls
+app.config["HTTP_POOL_SIZE"] = int(os.environ.get("HTTP_POOL_SIZE", 10))
+app.config["HTTP_RETRIES"] = int(os.environ.get("HTTP_RETRIES", 3))
+# Google calls per minute; calls over the quota wait instead of failing
+app.config["SHEETS_READS_PER_MINUTE"] = int(os.environ.get("SHEETS_READS_PER_MINUTE", 60))
+app.config["SHEETS_WRITES_PER_MINUTE"] = int(os.environ.get("SHEETS_WRITES_PER_MINUTE", 60))
+app.config["DRIVE_CALLS_PER_MINUTE"] = int(os.environ.get("DRIVE_CALLS_PER_MINUTE", 300))
+# The limits above are for the whole account, but every gunicorn worker
+# schedules its calls on its own: each gets its share. WEB_CONCURRENCY is
+# gunicorn's own setting for the number of workers.
+app.config["WEB_WORKERS"] = int(os.environ.get("WEB_CONCURRENCY", 1))
+# Lote selected by each operator: "memory" for a single process, "sqlite" to
+# share it between gunicorn workers. Dropped after LOTE_STORE_TTL idle seconds.
+app.config["LOTE_STORE"] = os.environ.get("LOTE_STORE", "memory")
+app.config["LOTE_STORE_PATH"] = os.environ.get("LOTE_STORE_PATH", "cache/lotes.sqlite3")
+app.config["LOTE_STORE_TTL"] = int(os.environ.get("LOTE_STORE_TTL", 3600))
+
+lote_store = create_lote_store(
+    app.config["LOTE_STORE"], app.config["LOTE_STORE_PATH"], app.config["LOTE_STORE_TTL"]
+)
 
 # Setup global logger
 logger = setup_logger()
 
-cgan_service = CGANService()
-cgan_service.login()
+cgan_service = CGANService(
+    backend=app.config["EXCEL_BACKEND"],
+    batches_ttl=app.config["BATCHES_TTL"],
+    cache=ResponseCache(app.config["CACHE_DIR"], app.config["CACHE_MAX_BYTES"]),
+    cache_max_age=app.config["CACHE_MAX_AGE"],
+    transport=Transport(
+        pool_size=app.config["HTTP_POOL_SIZE"], retries=app.config["HTTP_RETRIES"]
+    ),
+    quota=QuotaScheduler(
+        per_process_limits(
+            {
+                "sheets:read": app.config["SHEETS_READS_PER_MINUTE"],
+                "sheets:write": app.config["SHEETS_WRITES_PER_MINUTE"],
+                "drive:read": app.config["DRIVE_CALLS_PER_MINUTE"],
+                "drive:write": app.config["DRIVE_CALLS_PER_MINUTE"],
+            },
+            app.config["WEB_WORKERS"],
+        )
+    ),
+)
+# No login or spreadsheet access here: they happen on first use, or in the
+# background once /ready is probed, so workers boot without network calls
+
+# Job states go to the lote store, so with LOTE_STORE=sqlite any worker
+# answers the polls of a job
+jobs = JobManager(max_workers=app.config["JOB_WORKERS"], store=lote_store)
+
+
+def current_lote() -> dict:
+    """Lote context of the operator's session, None if none or expired"""
+    return lote_store.get(session.get("lote_key"))
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def start_warm_up():
+    """Run cgan_service.warm_up() in the background unless it is running"""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if cgan_service.ready:
+            return
+        if _warm_up_thread is None or not _warm_up_thread.is_alive():
+            _warm_up_thread = threading.Thread(target=cgan_service.warm_up, daemon=True)
+            _warm_up_thread.start()
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -36,39 +127,44 @@ def home():
     results_individuals = None
     lote = None
     if form.validate_on_submit():
-        batches = cgan_service.get_batches()
-        try:
-            logger.error(batches)
-
-            lote = batches[form.lote.data]
-        except KeyError:
+        # The transport logs in again and replays the call on a 401
+        lote = cgan_service.get_batch_id(form.lote.data)
+        if not lote:
             logger.error("Invalid lote")
-        if not cgan_service.token or not lote:
-            if not cgan_service.login():
+            if not cgan_service.token:
                 flash("Error de conexión con el servicio")
-                return render_template("index.html", form=form)
+            else:
+                flash("Número de lote incorrecto o no disponible.")
+            return render_template("index.html", form=form)
 
-        results_lote = cgan_service.get_lote_detail(lote)
-        results_individuals = cgan_service.get_lote_individuals(lote)
+        lote_data = cgan_service.fetch_lote(lote, force_refresh=form.refresh.data)
+        results_lote = lote_data["lote"]
+        results_individuals = lote_data["individuals"]
         if results_lote and results_individuals:
             results_lote = results_lote["body"]
             results_individuals = results_individuals["body"]
-            cgan_service.api_client.fill_info(results_lote)
-            clients = list(set(cgan_service.api_client.clients))
-            print(clients)
-            session["clients"] = clients
-            storage["results_lote"] = results_lote
-            storage["results_individuals"] = results_individuals
-            storage["lote"] = lote
+            clients = list(cgan_service.api_client.get_clients(results_lote))
+            logger.info(f"Clients for lote {lote}: {clients}")
 
             # Obtener datos de decomisos
-            decomisos_data = cgan_service.get_decomisos_data(lote)
+            decomisos_data = lote_data["decomisos"]
             if decomisos_data:
-                storage["decomisos_data"] = decomisos_data
                 logger.info(f"Decomisos data obtained for lote {lote}")
             else:
                 logger.warning(f"No se pudieron obtener datos de decomisos para lote {lote}")
-                storage["decomisos_data"] = None
+                decomisos_data = None
+
+            # Only the key goes into the session cookie
+            session["lote_key"] = lote_store.put(
+                {
+                    "lote": lote,
+                    "batch": results_lote["batch"],
+                    "clients": clients,
+                    "results_lote": results_lote,
+                    "results_individuals": results_individuals,
+                    "decomisos_data": decomisos_data,
+                }
+            )
 
             return redirect(url_for("loading"))
 
@@ -84,34 +180,82 @@ def home():
     )
 
 
+@app.route("/health")
+def health():
+    # Liveness only, never touches INFOCGAN or Google
+    return jsonify({"status": "ok"})
+
+
+@app.route("/ready")
+def ready():
+    start_warm_up()
+    status = {
+        "ready": cgan_service.ready,
+        "infocgan": bool(cgan_service.token),
+        "spreadsheet": cgan_service.api_client.ready,
+    }
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.route("/quota")
+def quota():
+    # Google calls of the last minute against the configured quotas
+    return jsonify(cgan_service.api_client.quota.stats())
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    # Prometheus text: stage timings and API counters since the app started,
+    # plus the Google quota use of the last minute
+    buckets = cgan_service.api_client.quota.stats()["buckets"]
+    body = metrics.render()
+    for field, help_text in (
+        ("limit", "Google calls allowed per minute"),
+        ("used", "Google calls sent in the last minute"),
+        ("queued", "Google calls waiting for quota"),
+    ):
+        body += render_gauge(
+            f"quota_{field}",
+            help_text,
+            "bucket",
+            {name: bucket[field] for name, bucket in buckets.items()},
+        )
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/download/<lote>")
 def download(lote):
+    # Only the lote of the operator's session is served; the URL part is
+    # never used to build a path
+    context = current_lote()
+    if not context:
+        abort(404)
     try:
-        lote = cgan_service.api_client.batch
-        # Create downloads directory if it doesn't exist
-        if not os.path.exists("downloads"):
-            os.makedirs("downloads")
-
-        # Path to the folder containing the files
-        folder_path = f"./downloads/{lote}"
-        # Path for the zip file
-        zip_path = f"./downloads/{lote}.zip"
-
-        # Create zip file
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            # Walk through the directory
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    # Create the full file path
-                    file_path = os.path.join(root, file)
-                    # Add file to zip (arcname removes the full path from the zip structure)
-                    arcname = os.path.relpath(file_path, folder_path)
-                    zipf.write(file_path, arcname)
-
-        logger.info(f"Created zip file: {zip_path}")
-
-        # Send the zip file
-        return send_file(zip_path, as_attachment=True, download_name=f"lote_{lote}.zip")
+        folder_path = batch_folder(context["batch"])
+    except ValueError as e:
+        logger.error(f"Refusing download: {str(e)}")
+        abort(404)
+    if not os.path.isdir(folder_path):
+        abort(404)
+
+    try:
+        batch = os.path.basename(folder_path)
+        # Path of the cached zip file, next to the batch folder
+        zip_path = f"{folder_path}.zip"
+        download_name = f"lote_{batch}.zip"
+
+        signature = folder_signature(folder_path)
+        if cached_zip(zip_path, signature):
+            logger.info(f"Sending cached zip file: {zip_path}")
+            return send_file(zip_path, as_attachment=True, download_name=download_name)
+
+        # Compress into the response while the zip is cached for next time
+        logger.info(f"Streaming zip file for {folder_path}")
+        return Response(
+            stream_with_context(stream_zip(folder_path, zip_path, signature)),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{download_name}"'},
+        )
 
     except Exception as e:
         logger.error(f"Error creating zip file: {str(e)}")
@@ -121,40 +265,36 @@ def download(lote):
 
 @app.route("/loading")
 def loading():
-    lote = storage.get("lote")
-    if not lote:
+    context = current_lote()
+    if not context:
         flash("No hay lote seleccionado.")
         return redirect(url_for("home"))
-    return render_template("loading.html", lote=lote)
+    return render_template("loading.html", lote=context["lote"])
 
 
-@app.route("/process", methods=["GET"])
+@app.route("/process", methods=["POST"])
 def process_batch():
     try:
-        clients = session.get("clients", [])
-        results_lote = storage["results_lote"]
-        results_individuals = storage["results_individuals"]
-
-        # Escribir decomisos a Google Sheets (una sola vez, no por cliente)
-        decomisos_data = storage.get("decomisos_data")
-        if decomisos_data:
-            logger.info("Escribiendo datos de decomisos a Google Sheets")
-            cgan_service.api_client.fill_decomisos(decomisos_data)
-        else:
-            logger.warning("No hay datos de decomisos para escribir")
-
-        # Aprobar automáticamente todos los clientes
-        for client in clients:
-            logger.info(f"Aprobando automáticamente cliente: {client}")
-            cgan_service.api_client.fill_despacho(results_individuals, client)
-            cgan_service.api_client.fill_liquidacion(results_lote, client)
-            cgan_service.api_client.download_sheet(client)
-            cgan_service.api_client.download_sheet_pdf(client)
-            cgan_service.api_client.copy_consecutivo_row(6)
-            cgan_service.api_client.download_consecutivos_sheet()
+        context = current_lote()
+        if not context:
+            return jsonify({"success": False, "error": "No hay lote seleccionado."})
+
+        # Aprobar automáticamente todos los clientes en segundo plano
+        job = jobs.submit(
+            f"Lote {context['lote']}",
+            process_lote,
+            cgan_service.api_client,
+            context["clients"],
+            context["results_lote"],
+            context["results_individuals"],
+            context["decomisos_data"],
+            max_workers=app.config["CLIENT_WORKERS"],
+        )
 
         return jsonify({
             "success": True,
+            "job_id": job.id,
+            "status_url": url_for("job_status", job_id=job.id),
             "redirect": url_for("download_page")
         })
     except Exception as e:
@@ -165,21 +305,40 @@ def process_batch():
         })
 
 
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    state = jobs.state(job_id)
+    if not state:
+        return jsonify({"success": False, "error": "Trabajo no encontrado"}), 404
+    return jsonify(state)
+
+
 @app.route("/complete")
 def download_page():
-    return render_template("download.html", lote=storage["lote"])
+    context = current_lote()
+    if not context:
+        flash("No hay lote seleccionado.")
+        return redirect(url_for("home"))
+    return render_template("download.html", lote=context["lote"])
 
 
 @app.route("/download/consecutivos")
 def download_consecutivos():
+    # The export process_lote wrote for the session's lote; the shared
+    # api_client holds no lote of its own
+    context = current_lote()
+    if not context:
+        abort(404)
     try:
-        filepath = cgan_service.api_client.download_consecutivos_sheet()
-        return send_file(
-            filepath, as_attachment=True, download_name=os.path.basename(filepath)
-        )
-    except Exception as e:
-        flash(f"Error al descargar el archivo: {str(e)}")
-        return redirect(url_for("home"))
+        folder_path = batch_folder(context["batch"])
+    except ValueError as e:
+        logger.error(f"Refusing download: {str(e)}")
+        abort(404)
+    filepath = os.path.join(folder_path, "Consecutivos.xlsx")
+    if not os.path.isfile(filepath):
+        flash("Consecutivos aún no ha sido exportado para este lote.")
+        return redirect(url_for("download_page"))
+    return send_file(filepath, as_attachment=True, download_name="Consecutivos.xlsx")
 
 
 @app.route("/download/report")
@@ -0,0 +1,142 @@
+"""
+Time of parsing a large dispatch summary, full against read-only workbook.
+
+Builds a summary workbook with --rows quantity rows spread over sections and
+--rows reason rows, then parses it with the row loop of services.excel.Client
+over:
+
+- full: load_workbook(data_only=True), the former parse_decomisos_excel
+- read-only: Client.parse_decomisos_excel, load_workbook(read_only=True)
+
+The peak of Python allocations of one parse is shown next to the time.
+
+Both must give the same rows; the script exits with status 1 if they don't.
+
+Usage:
+    python benchmarks/decomisos_parse.py --rows 50000
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook, load_workbook  # noqa: E402
+from services.excel import Client  # noqa: E402
+
+SECTIONS = ["CALIDAD", "CANALES", "VÍSCERAS ROJAS", "VÍSCERAS BLANCAS"]
+ORGANS = ["Hígado", "Pulmón", "Corazón", "Riñón", "Canal"]
+PATHOLOGIES = ["Abscesos", "Neumonía", "Pericarditis", "Nefritis", "Contaminación"]
+
+
+def build_workbook(rows: int) -> bytes:
+    workbook = Workbook(write_only=True)
+    cantidades = workbook.create_sheet("Cantidades decomisadas")
+    cantidades.append(["Resumen de despacho lote 250627-6566"])
+    cantidades.append([])
+    start = datetime.datetime(2025, 6, 27, 5, 0, 0)
+    per_section = max(1, rows // len(SECTIONS))
+    for section in SECTIONS:
+        cantidades.append([section])
+        cantidades.append(["Individuo", "Órgano", "Cantidad", "Unidad", "Fecha Registro"])
+        for row in range(per_section):
+            cantidades.append(
+                [
+                    f"6566-{row + 1}",
+                    ORGANS[row % len(ORGANS)],
+                    # Some rows without a quantity or unit
+                    None if row % 17 == 0 else round(0.5 + row % 40 * 0.25, 2),
+                    "" if row % 23 == 0 else "kg",
+                    start + datetime.timedelta(minutes=row),
+                ]
+            )
+        cantidades.append([])
+
+    motivos = workbook.create_sheet("Motivos de decomisos")
+    motivos.append(["Motivos"])
+    motivos.append(["Individuo", "Organo", "Patología", "Decomiso Total", "Fecha Registro"])
+    for row in range(rows):
+        total = ["Si", "No", True, False, None][row % 5]
+        motivos.append(
+            [
+                f"6566-{row + 1}",
+                ORGANS[row % len(ORGANS)],
+                PATHOLOGIES[row % len(PATHOLOGIES)],
+                total,
+                start + datetime.timedelta(minutes=row),
+            ]
+        )
+    motivos.append([])
+    motivos.append(["Generado por INFOCGAN"])
+
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def full_load(client: Client, excel_bytes: bytes) -> dict:
+    """Former parse_decomisos_excel: the same row loop over a full-mode workbook"""
+    workbook = load_workbook(BytesIO(excel_bytes), data_only=True)
+    return {
+        "cantidades": client._parse_cantidades_sheet(workbook["Cantidades decomisadas"]),
+        "motivos": client._parse_motivos_sheet(workbook["Motivos de decomisos"]),
+    }
+
+
+def timed(fn, excel_bytes: bytes, repeat: int):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(excel_bytes)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def peak_memory(fn, excel_bytes: bytes) -> float:
+    """Peak of Python allocations during one call, in MiB"""
+    tracemalloc.start()
+    try:
+        fn(excel_bytes)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    excel_bytes = build_workbook(args.rows)
+    print(f"{args.rows} rows per sheet, {len(excel_bytes) / 1024:.0f} KiB xlsx")
+    client = Client()
+    expected, full_time = timed(lambda data: full_load(client, data), excel_bytes, args.repeat)
+    actual, read_only_time = timed(client.parse_decomisos_excel, excel_bytes, args.repeat)
+    full_peak = peak_memory(lambda data: full_load(client, data), excel_bytes)
+    read_only_peak = peak_memory(client.parse_decomisos_excel, excel_bytes)
+    print(f"{'full':<12} {full_time:7.2f} s {full_peak:8.1f} MiB")
+    print(
+        f"{'read-only':<12} {read_only_time:7.2f} s {read_only_peak:8.1f} MiB"
+        f"   x{full_time / read_only_time:.1f}"
+    )
+
+    mismatched = False
+    for key in ("cantidades", "motivos"):
+        if actual[key] != expected[key]:
+            mismatched = True
+            print(f"{key}: {len(actual[key])} rows, expected {len(expected[key])}")
+            for got, want in zip(actual[key], expected[key]):
+                if got != want:
+                    print(f"  first difference: {got!r} != {want!r}")
+                    break
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Memory ceiling and time of utils.excel_to_pdf on a large despacho-like sheet.
+
+Builds a workbook with --rows rows of 18 columns and measures the peak of
+Python allocations (tracemalloc) of:
+
+- full-mode load: load_workbook() plus list(iter_rows()), the part of the
+  former renderer that kept every cell object alive before drawing
+- read_sheet: the read-only streaming pass of the new renderer alone
+- excel_to_pdf: the whole renderer, pagination and drawing included, in
+  the calling thread and with --workers render processes
+
+Usage:
+    python benchmarks/excel_to_pdf.py --rows 10000 --workers 4
+"""
+import argparse
+import datetime
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook, load_workbook  # noqa: E402
+from openpyxl.styles import Font, PatternFill  # noqa: E402
+from PyPDF2 import PdfReader  # noqa: E402
+from utils import StyleCache, excel_to_pdf, read_sheet  # noqa: E402
+
+
+def build_workbook(path: str, rows: int):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("despacho")
+    header_fill = PatternFill("solid", fgColor="FFD9D9D9", bgColor="FFD9D9D9")
+    sheet.append([f"Columna {column}" for column in range(1, 19)])
+    start = datetime.datetime(2025, 7, 23, 5, 0, 0)
+    for row in range(rows):
+        sheet.append(
+            [
+                start,
+                start + datetime.timedelta(hours=1),
+                f"6566-{row + 1}",
+                "",
+                "GRANJA",
+                110.5 + row % 20,
+                88.1,
+                "",
+                87.2,
+                12,
+                60.1,
+                "U",
+                55.5,
+                50.1,
+                1,
+                f"CLIENTE {row % 5}",
+                f"ABC{row % 5}",
+                f"D{row % 5}",
+            ]
+        )
+    workbook.save(path)
+    # Style the header with a regular workbook, write-only rows can't
+    styled = load_workbook(path)
+    for cell in styled["despacho"][1]:
+        cell.font = Font(bold=True, sz=11)
+        cell.fill = header_fill
+    styled.save(path)
+
+
+def measure(label: str, fn):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<20} peak {peak / 1024 / 1024:8.1f} MiB   {elapsed:7.2f} s")
+
+
+def full_mode_load(path: str):
+    workbook = load_workbook(path, data_only=True)
+    for sheet in workbook.worksheets:
+        rows = list(sheet.iter_rows())
+        columns = list(sheet.iter_cols())
+        del rows, columns
+
+
+def read_only_pass(path: str):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            read_sheet(sheet, StyleCache())
+    finally:
+        workbook.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "despacho.xlsx")
+        build_workbook(path, args.rows)
+        print(f"{args.rows} rows x 18 columns, {os.path.getsize(path) / 1024:.0f} KiB xlsx")
+        measure("full-mode load", lambda: full_mode_load(path))
+        measure("read_sheet", lambda: read_only_pass(path))
+        measure("excel_to_pdf", lambda: excel_to_pdf(path, BytesIO()))
+        pdf = BytesIO()
+        started = time.perf_counter()
+        excel_to_pdf(path, pdf, workers=args.workers)
+        elapsed = time.perf_counter() - started
+        pages = len(PdfReader(BytesIO(pdf.getvalue())).pages)
+        print(
+            f"{'excel_to_pdf x' + str(args.workers):<20} {pages} pages, "
+            f"{len(pdf.getvalue()) / 1024:.0f} KiB   {elapsed:7.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+End-to-end and per-stage timings of whole lotes, without network access.
+
+Each combination of --animals and --clients is a synthetic lote
+(benchmarks.offline.payloads) served by a local fake INFOCGAN server and
+processed the way bulk.py does it: fetch_lote through services.transport,
+then process_lote on the "sheets" backend against the in-process fake of
+Sheets and Drive (benchmarks.offline.fake_google), liquidación PDFs included.
+Latencies, error rate and Google quotas are configurable; the defaults are
+close to what the real services take.
+
+For every lote the wall time, the Google and INFOCGAN calls and the slowest
+stages recorded by services.metrics are printed; --stages prints every stage
+and --json saves the full summaries. Files are written to a temporary folder.
+
+Usage:
+    python benchmarks/lote_pipeline.py
+    python benchmarks/lote_pipeline.py --animals 500 --clients 20 \\
+        --client-workers 1 4 --per-minute 60 --stages
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.offline import payloads  # noqa: E402
+from benchmarks.offline.fake_google import FakeGoogle  # noqa: E402
+from benchmarks.offline.fake_infocgan import FakeINFOCGAN  # noqa: E402
+from services import metrics  # noqa: E402
+from services.api import CGANService  # noqa: E402
+from services.bulk import process_one  # noqa: E402
+from services.cache import ResponseCache  # noqa: E402
+from services.quota import DEFAULT_LIMITS, QuotaScheduler  # noqa: E402
+from services.transport import Transport  # noqa: E402
+
+
+def run_lote(args, server: FakeINFOCGAN, workdir: str, lote_id: int, workers: int) -> dict:
+    limits = dict.fromkeys(DEFAULT_LIMITS, args.per_minute) if args.per_minute else None
+    # Without --per-minute neither side limits the calls
+    quota = QuotaScheduler(limits or dict.fromkeys(DEFAULT_LIMITS, 10**6), backoff=0.5)
+    cgan_service = CGANService(
+        backend="sheets",
+        cache=ResponseCache(os.path.join(workdir, "cache")),
+        transport=Transport(backoff=0.05),
+        quota=quota,
+    )
+    server.point(cgan_service)
+    api_client = cgan_service.api_client
+    api_client.path = os.path.join(ROOT, "assets", "base.xlsx")
+    google = FakeGoogle(
+        quota,
+        api_client.path,
+        latency=args.google_latency,
+        slow_latency=args.slow_latency,
+        limits=limits,
+    )
+    api_client.sheets_api_client = google
+    api_client.export_worksheet_pdf = google.export_worksheet_pdf
+
+    batch_number = payloads.batch_number(lote_id)
+    started = time.perf_counter()
+    with metrics.collect() as lote_metrics:
+        cgan_service.login()
+        resolved = cgan_service.get_batch_id(batch_number)
+        result = process_one(cgan_service, batch_number, resolved, workers, True)
+    elapsed = time.perf_counter() - started
+    return {
+        "seconds": round(elapsed, 3),
+        "clients": len(result["clients"]),
+        "google_calls": dict(google.served),
+        "google_rejected": dict(google.rejected),
+        "timings": lote_metrics.summary(),
+    }
+
+
+def print_row(animals: int, clients: int, workers: int, outcome: dict, stages: bool):
+    timings = outcome["timings"]
+    apis = timings["apis"]
+    google = sum(outcome["google_calls"].values())
+    infocgan = apis.get("infocgan", {})
+    retries = sum(counts["retries"] for counts in apis.values())
+    slowest = sorted(
+        timings["stages"].items(), key=lambda item: item[1]["seconds"], reverse=True
+    )
+    print(
+        f"{animals:>7} {clients:>7} {workers:>7} {outcome['seconds']:>9.2f} "
+        f"{google:>7} {infocgan.get('calls', 0):>8} {retries:>7}  "
+        + ", ".join(f"{stage} {entry['seconds']:.2f}" for stage, entry in slowest[:3])
+    )
+    if stages:
+        for stage, entry in slowest:
+            print(f"{'':>8}{stage:<34} {entry['count']:>6} {entry['seconds']:>9.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--animals", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--client-workers", type=int, nargs="+", default=[4])
+    parser.add_argument(
+        "--google-latency", type=float, default=0.15, help="Seconds per Sheets call"
+    )
+    parser.add_argument(
+        "--slow-latency", type=float, default=1.0, help="Seconds per Drive copy or export"
+    )
+    parser.add_argument(
+        "--infocgan-latency", type=float, default=0.2, help="Seconds per INFOCGAN request"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of INFOCGAN GETs answering 503"
+    )
+    parser.add_argument(
+        "--per-minute", type=int, help="Google calls per minute and bucket, unlimited if omitted"
+    )
+    parser.add_argument("--stages", action="store_true", help="Print every stage")
+    parser.add_argument("--json", help="Save every summary to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.getLogger("comcer").setLevel(args.log_level)
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = tempfile.mkdtemp(prefix="lote_pipeline-")
+    os.chdir(workdir)
+    server = FakeINFOCGAN(latency=args.infocgan_latency, error_rate=args.error_rate)
+    combinations = [
+        (animals, clients, workers)
+        for animals in args.animals
+        for clients in args.clients
+        if clients <= animals
+        for workers in args.client_workers
+    ]
+    for lote_id, (animals, clients, _) in enumerate(combinations, start=7000):
+        server.add_lote(
+            lote_id,
+            payloads.lote_body(lote_id, animals, clients),
+            payloads.individuals_body(lote_id, animals, clients),
+            payloads.dispatch_summary(lote_id, animals),
+        )
+
+    print(f"files in {workdir}")
+    print(
+        f"{'animals':>7} {'clients':>7} {'workers':>7} {'seconds':>9} "
+        f"{'google':>7} {'infocgan':>8} {'retries':>7}  slowest stages (s)"
+    )
+    results = []
+    with server:
+        for lote_id, (animals, clients, workers) in enumerate(combinations, start=7000):
+            outcome = run_lote(args, server, workdir, lote_id, workers)
+            print_row(animals, clients, workers, outcome, args.stages)
+            results.append(
+                {"animals": animals, "clients": clients, "workers": workers, **outcome}
+            )
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Offline stand-ins for INFOCGAN and Google Sheets/Drive, used by
+benchmarks/lote_pipeline.py to run whole lotes without network access.
+"""
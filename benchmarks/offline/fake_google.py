@@ -0,0 +1,294 @@
+"""
+In-process stand-in for the gspread client of services.excel.Client.
+
+FakeGoogle answers the Sheets and Drive calls Client makes in its "sheets"
+backend: opening the template and Consecutivos, Drive copies and deletes,
+values:batchUpdate / batchClear / batchGet, row reads, appends, exports and
+file metadata, and the worksheet PDF export of Client.export_worksheet_pdf. The spreadsheets are LocalSpreadsheet copies of
+assets/base.xlsx, so the cells written are the real ones.
+
+Every call behaves like a request to Google:
+
+- it goes through the Client's QuotaScheduler under the bucket gspread's
+  requests would use, as ScheduledHTTPClient does;
+- the "server" keeps its own per-minute limits per bucket and answers
+  RateLimited (429) past them, so throttling and its retries can be
+  measured;
+- it takes latency seconds (slow_latency for copies and exports), or
+  longer if the fake's own openpyxl work does.
+
+That work runs in this process: copies and exports hold the GIL for a
+fraction of a second each, so parallel runs come out somewhat slower than
+against Google.
+
+Formulas are not evaluated: a formula cell reads back as "0", so the Consec
+row of every client still reaches Consecutivos as it does in production.
+
+Install it on a Client before the first call:
+
+    client.sheets_api_client = google = FakeGoogle(client.quota, latency=0.05)
+    client.export_worksheet_pdf = google.export_worksheet_pdf
+
+PDFs are drawn by utils.excel_to_pdf from the fake's workbook, with formula
+cells blank.
+"""
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from io import BytesIO
+from openpyxl import Workbook
+from services.consecutivos import CONSECUTIVOS_KEY
+from services.local_sheets import LocalSpreadsheet
+from services.quota import QuotaScheduler, RateLimited
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, local):
+        self.spreadsheet = spreadsheet
+        self.local = local
+
+    @property
+    def title(self) -> str:
+        return self.local.title
+
+    @property
+    def id(self) -> int:
+        return self.local.id
+
+    def row_values(self, row: int) -> list:
+        def read():
+            values = [
+                "0" if isinstance(cell.value, str) and cell.value.startswith("=")
+                else "" if cell.value is None
+                else cell.value
+                for cell in self.local.sheet[row]
+            ]
+            while values and values[-1] == "":
+                values.pop()
+            return values
+
+        return self.spreadsheet._call("sheets:read", read)
+
+    def append_rows(self, values: list, value_input_option=None, insert_data_option=None, **kwargs):
+        def append():
+            for row in values:
+                self.local.sheet.append(row)
+            self.spreadsheet.revision += 1
+            return {"updates": {"updatedRows": len(values)}}
+
+        return self.spreadsheet._call("sheets:write", append)
+
+
+class FakeSpreadsheet:
+    def __init__(self, google, local: LocalSpreadsheet, key: str = None):
+        self.google = google
+        self.local = local
+        self.id = key or uuid.uuid4().hex
+        self.title = local.title
+        self.revision = 0
+        # openpyxl workbooks are not thread-safe
+        self._lock = threading.Lock()
+        # (revision, xlsx bytes) of the last export, reused by copies
+        self._content = None
+
+    def content(self) -> bytes:
+        """xlsx bytes of the current revision, call holding _lock"""
+        if self._content is None or self._content[0] != self.revision:
+            self._content = (self.revision, self.local.export())
+        return self._content[1]
+
+    def _call(self, bucket: str, fn, latency: float = None):
+        def locked():
+            with self._lock:
+                return fn()
+
+        return self.google._call(bucket, locked, latency)
+
+    def _worksheets(self) -> list:
+        return [FakeWorksheet(self, worksheet) for worksheet in self.local.worksheets()]
+
+    def worksheets(self) -> list:
+        return self._call("sheets:read", self._worksheets)
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        return self._call(
+            "sheets:read", lambda: FakeWorksheet(self, self.local.worksheet(title))
+        )
+
+    @property
+    def sheet1(self) -> FakeWorksheet:
+        return self._call("sheets:read", lambda: self._worksheets()[0])
+
+    def values_batch_update(self, body: dict = None, **kwargs):
+        def update():
+            self.local.values_batch_update(body)
+            self.revision += 1
+            return {"totalUpdatedCells": sum(len(row) for d in body["data"] for row in d["values"])}
+
+        return self._call("sheets:write", update)
+
+    def values_batch_clear(self, params: dict = None, body: dict = None):
+        def clear():
+            self.local.values_batch_clear(params, body)
+            self.revision += 1
+            return {"clearedRanges": (body or {}).get("ranges", [])}
+
+        return self._call("sheets:write", clear)
+
+    def values_batch_get(self, ranges: list, params: dict = None):
+        def get():
+            value_ranges = []
+            for range_name in ranges:
+                worksheet, a1_range = self.local._split_range(range_name)
+                # "A2:E" runs to the last row of the sheet
+                if a1_range and a1_range[-1].isalpha():
+                    a1_range += str(worksheet.sheet.max_row)
+                min_col, min_row, max_col, max_row = worksheet._boundaries(a1_range or "A1")
+                rows = []
+                for row in worksheet.sheet.iter_rows(
+                    min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col,
+                    values_only=True,
+                ):
+                    values = ["" if value is None else value for value in row]
+                    while values and values[-1] == "":
+                        values.pop()
+                    rows.append(values)
+                while rows and not rows[-1]:
+                    rows.pop()
+                value_ranges.append({"range": range_name, "values": rows})
+            return {"valueRanges": value_ranges}
+
+        return self._call("sheets:read", get)
+
+    def add_worksheet(self, title: str, rows: int = 100, cols: int = 26):
+        def add():
+            self.revision += 1
+            return FakeWorksheet(self, self.local.add_worksheet(title, rows, cols))
+
+        return self._call("sheets:write", add)
+
+    def export(self, format=None) -> bytes:
+        return self._call("drive:read", self.content, self.google.slow_latency)
+
+
+class FakeGoogle:
+    def __init__(
+        self,
+        quota: QuotaScheduler,
+        template_path: str = "./assets/base.xlsx",
+        latency: float = 0.0,
+        slow_latency: float = None,
+        limits: dict = None,
+    ):
+        """
+        Args:
+            quota: QuotaScheduler of the Client, every call goes through it
+            template_path: Workbook served for any key but Consecutivos
+            latency: Seconds every call takes
+            slow_latency: Seconds of Drive copies and exports, latency by default
+            limits: Calls per minute Google accepts per bucket before
+                answering 429, unlimited for buckets not given
+        """
+        self.quota = quota
+        self.template_path = template_path
+        self.latency = latency
+        self.slow_latency = latency if slow_latency is None else slow_latency
+        self.limits = limits or {}
+        self._lock = threading.Lock()
+        self._sent = {}
+        self.files = {}
+        self.served = Counter()
+        self.rejected = Counter()
+
+    def _call(self, bucket: str, fn, latency: float = None):
+        return self.quota.call(bucket, self._serve, bucket, fn, latency)
+
+    def _serve(self, bucket: str, fn, latency: float = None):
+        limit = self.limits.get(bucket)
+        with self._lock:
+            now = time.monotonic()
+            sent = self._sent.setdefault(bucket, deque())
+            while sent and sent[0] < now - 60:
+                sent.popleft()
+            if limit and len(sent) >= limit:
+                self.rejected[bucket] += 1
+                wait = int(sent[0] + 60 - now) + 1
+                raise RateLimited(f"Fake {bucket} quota exceeded", str(wait))
+            sent.append(now)
+            self.served[bucket] += 1
+        # The fake's own work (openpyxl copies and saves) counts towards it
+        started = time.perf_counter()
+        result = fn()
+        remaining = (self.latency if latency is None else latency) - (
+            time.perf_counter() - started
+        )
+        if remaining > 0:
+            time.sleep(remaining)
+        return result
+
+    def _file(self, key: str) -> FakeSpreadsheet:
+        spreadsheet = self.files.get(key)
+        if spreadsheet is None:
+            raise KeyError(f"No spreadsheet {key}")
+        return spreadsheet
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        def open_file():
+            with self._lock:
+                if key not in self.files:
+                    if key == CONSECUTIVOS_KEY:
+                        workbook = Workbook()
+                        workbook.active.title = "Consecutivos"
+                        content = BytesIO()
+                        workbook.save(content)
+                        local = LocalSpreadsheet(BytesIO(content.getvalue()), "Consecutivos")
+                    else:
+                        local = LocalSpreadsheet(self.template_path)
+                        if "Decomisos" not in local.workbook.sheetnames:
+                            local.add_worksheet("Decomisos")
+                    self.files[key] = FakeSpreadsheet(self, local, key)
+                return self.files[key]
+
+        return self._call("sheets:read", open_file)
+
+    def copy(self, file_id: str, title: str = None, copy_comments: bool = True, **kwargs):
+        source = self._file(file_id)
+
+        def copy_file():
+            with source._lock:
+                content = source.content()
+            local = LocalSpreadsheet(BytesIO(content), title)
+            spreadsheet = FakeSpreadsheet(self, local)
+            with self._lock:
+                self.files[spreadsheet.id] = spreadsheet
+            return spreadsheet
+
+        return self._call("drive:write", copy_file, self.slow_latency)
+
+    def del_spreadsheet(self, file_id: str):
+        def delete():
+            with self._lock:
+                self.files.pop(file_id, None)
+
+        return self._call("drive:write", delete)
+
+    def export(self, file_id: str, format=None) -> bytes:
+        spreadsheet = self._file(file_id)
+        return spreadsheet._call("drive:read", spreadsheet.content, self.slow_latency)
+
+    def export_worksheet_pdf(self, worksheet: FakeWorksheet) -> bytes:
+        """Stand-in for the docs.google.com PDF export of one tab"""
+        spreadsheet = worksheet.spreadsheet
+        return spreadsheet._call(
+            "drive:read",
+            lambda: spreadsheet.local.export_worksheet_pdf(worksheet.local),
+            self.slow_latency,
+        )
+
+    def get_file_drive_metadata(self, file_id: str) -> dict:
+        spreadsheet = self._file(file_id)
+        return self._call(
+            "drive:read",
+            lambda: {"id": file_id, "modifiedTime": str(spreadsheet.revision)},
+        )
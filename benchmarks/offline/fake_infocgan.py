@@ -0,0 +1,155 @@
+"""
+Local HTTP server answering the INFOCGAN endpoints CGANService calls.
+
+FakeINFOCGAN listens on 127.0.0.1 and serves the lotes given to it, built
+by benchmarks.offline.payloads:
+
+    POST /api/login                        -> {"user": {"token": ...}}
+    POST /api/batch/search                 -> {"body": [{"batch", "id"}]}
+    GET  /api/batch/<id>                   -> {"body": lote}
+    GET  /api/monitoring/individuals/<id>  -> {"body": individuals}
+    GET  /api/summary/dispatch/<id>        -> {"body": {"path": "storage/..."}}
+    GET  /storage/<id>-resumen-despacho.xlsx
+
+Every answer waits latency seconds first, and a share error_rate of the GETs
+answer 503 so the retries of services.transport are exercised. Requests
+without the token answer 401. point() aims a CGANService at the server.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN = "offline-token"
+
+
+class FakeINFOCGAN:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            latency: Seconds every request takes before it is answered
+            error_rate: Share of GETs answered with 503
+            seed: Seed of the failures
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # lote id -> {"lote": body, "individuals": body, "summary": bytes}
+        self.lotes = {}
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/"
+
+    def add_lote(self, lote_id: int, lote: dict, individuals: list, summary: bytes):
+        self.lotes[lote_id] = {"lote": lote, "individuals": individuals, "summary": summary}
+
+    def point(self, cgan_service):
+        """Send the requests of a CGANService to this server"""
+        cgan_service.login_url = f"{self.url}api/login"
+        cgan_service.api_url = f"{self.url}api/"
+        cgan_service.storage_url = self.url
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _fails(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            return self._random.random() < self.error_rate
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes = b"", content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, payload, status: int = 200):
+                self._send(status, json.dumps(payload).encode())
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _authorized(self) -> bool:
+                return self.headers.get("Authorization") == f"Bearer {TOKEN}"
+
+            def do_POST(self):
+                self._read_body()
+                time.sleep(fake.latency)
+                fake._fails()
+                if self.path == "/api/login":
+                    return self._json({"user": {"token": TOKEN}})
+                if not self._authorized():
+                    return self._json({"message": "Unauthorized"}, 401)
+                if self.path == "/api/batch/search":
+                    return self._json(
+                        {
+                            "body": [
+                                {"batch": lote["lote"]["batch"], "id": lote_id}
+                                for lote_id, lote in fake.lotes.items()
+                            ]
+                        }
+                    )
+                self._json({"message": "Not found"}, 404)
+
+            def do_GET(self):
+                time.sleep(fake.latency)
+                if fake._fails():
+                    return self._json({"message": "Unavailable"}, 503)
+                match = re.fullmatch(r"/storage/(\d+)-resumen-despacho\.xlsx", self.path)
+                if match:
+                    lote = fake.lotes.get(int(match.group(1)))
+                    if lote is None:
+                        return self._json({"message": "Not found"}, 404)
+                    return self._send(
+                        200,
+                        lote["summary"],
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    )
+                if not self._authorized():
+                    return self._json({"message": "Unauthorized"}, 401)
+                match = re.fullmatch(
+                    r"/api/(batch|monitoring/individuals|summary/dispatch)/(\d+)", self.path
+                )
+                lote = fake.lotes.get(int(match.group(2))) if match else None
+                if lote is None:
+                    return self._json({"message": "Not found"}, 404)
+                resource, lote_id = match.group(1), match.group(2)
+                if resource == "batch":
+                    return self._json({"body": lote["lote"]})
+                if resource == "monitoring/individuals":
+                    return self._json({"body": lote["individuals"]})
+                self._json({"body": {"path": f"storage/{lote_id}-resumen-despacho.xlsx"}})
+
+        return Handler
@@ -0,0 +1,186 @@
+"""
+Synthetic INFOCGAN payloads of any size.
+
+lote_body, individuals_body and dispatch_summary build the three things a
+lote is made of, in the shapes CGANService returns them: the "batch" body
+(dispatched destinations with their vehicles), the "monitoring/individuals"
+body (one entry per animal with its destination) and the dispatch-summary
+workbook that Client.parse_decomisos_excel parses. Everything is derived
+from a seed, so two runs of the same size process identical data.
+"""
+import datetime
+import random
+from io import BytesIO
+from openpyxl import Workbook
+
+CLIENT_NAMES = [
+    "CARNES VITAL SAS",
+    "CARNES COSTA AZUL",
+    "FRIGORIFICO SAN JUAN",
+    "INVERSIONES SOGA SA",
+    "COMERCIALIZADORA EL PORVENIR",
+]
+SECTIONS = ["CALIDAD", "CANALES", "VÍSCERAS ROJAS", "VÍSCERAS BLANCAS"]
+ORGANS = ["Hígado", "Pulmón", "Corazón", "Riñón", "Canal"]
+PATHOLOGIES = ["Abscesos", "Neumonía", "Pericarditis", "Nefritis", "Contaminación"]
+SEUROP = ["S", "E", "U", "R", "O", "P"]
+
+START = datetime.datetime(2025, 6, 27, 17, 12, 56)
+
+
+def _when(offset_minutes: float) -> str:
+    return (START + datetime.timedelta(minutes=offset_minutes)).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+
+
+def batch_number(lote_id: int) -> str:
+    return f"250627-{lote_id}"
+
+
+def client_names(clients: int) -> list:
+    names = CLIENT_NAMES[:clients]
+    names += [f"CLIENTE {index:02d} SAS" for index in range(len(names) + 1, clients + 1)]
+    return names
+
+
+def destinations(animals: int, clients: int, seed: int = 0) -> list:
+    """Destination index of every animal, uneven between clients like real lotes"""
+    rng = random.Random(seed)
+    weights = [rng.uniform(0.5, 2) for _ in range(clients)]
+    # Every client gets at least one animal
+    assigned = list(range(min(clients, animals)))
+    assigned += rng.choices(range(clients), weights, k=animals - len(assigned))
+    rng.shuffle(assigned)
+    return assigned
+
+
+def lote_body(lote_id: int, animals: int, clients: int, seed: int = 0) -> dict:
+    """Body of GET batch/<lote_id>"""
+    names = client_names(clients)
+    counts = [0] * clients
+    for destination in destinations(animals, clients, seed):
+        counts[destination] += 1
+    dispatched = []
+    for index, (name, count) in enumerate(zip(names, counts)):
+        plate = f"{chr(65 + index % 26)}{chr(65 + index // 26 % 26)}X{index:03d}"
+        dispatched.append(
+            {
+                "iddestination": index + 1,
+                "namedestination": name,
+                "dispatchvehicle": {"plate": plate},
+                "dispatch": {"code": f"DE-{index + 1}"},
+                "quantityprocessed": count,
+                "quantityvisceras": 0,
+                "vehiclesdispatch": [
+                    {
+                        "plate": plate,
+                        "startdate": _when(5000 + index * 20),
+                        "enddate": _when(5015 + index * 20),
+                    }
+                ],
+            }
+        )
+    return {
+        "batch": batch_number(lote_id),
+        "createdAt": _when(74),
+        "register": {"createdAt": _when(0)},
+        "total": animals,
+        "totalweight": animals * 115,
+        "individualssumary": {
+            "beneficiaries": animals,
+            "avgbackfat": 15.75,
+            "weigthed": animals,
+        },
+        "benefitdate": _when(454),
+        "databenefit": {
+            "rcc": 83.47,
+            "rcr": 80.1,
+            "pcc": 95.29,
+            "pcr": 91.6,
+            "ml": 72.56,
+            "mckg": 52.92,
+            "pcec": 1,
+            "datebenefit": _when(454),
+        },
+        "customerinvoice": {"label": "INVERSIONES SOGA SA"},
+        "customerplant": {"label": "IVAN"},
+        "disembark": {"createdAt": _when(72)},
+        "averageweight": 115,
+        "property": {"label": "LA CIRCASIA"},
+        "weights": [{"weightdate": _when(74)}],
+        "dispatched": dispatched,
+    }
+
+
+def individuals_body(lote_id: int, animals: int, clients: int, seed: int = 0) -> list:
+    """Body of GET monitoring/individuals/<lote_id>"""
+    rng = random.Random(seed + 1)
+    names = client_names(clients)
+    individuals = []
+    for consecutive, destination in enumerate(destinations(animals, clients, seed), 1):
+        pcc = round(rng.uniform(75, 110), 1)
+        individuals.append(
+            {
+                "batch": batch_number(lote_id),
+                "destination": {"value": destination + 1, "label": names[destination]},
+                "consecutive": consecutive,
+                "property": {"label": "LA CIRCASIA"},
+                "ppe": rng.randint(95, 135),
+                "pcc": pcc,
+                "pcr": round(pcc * 1.2, 1),
+                "gd": round(rng.uniform(8, 25), 1),
+                "ml": rng.randint(55, 75),
+                "seurop": rng.choice(SEUROP),
+                "mc": rng.randint(45, 62),
+                "mckg": rng.randint(40, 60),
+                "indexpse": rng.randint(30, 70),
+            }
+        )
+    return individuals
+
+
+def dispatch_summary(lote_id: int, animals: int, seed: int = 0) -> bytes:
+    """
+    Dispatch-summary workbook with a seizure for about one animal in five,
+    spread over the sections of the "Cantidades decomisadas" sheet.
+    """
+    rng = random.Random(seed + 2)
+    seized = [index for index in range(1, animals + 1) if rng.random() < 0.2]
+    workbook = Workbook(write_only=True)
+
+    cantidades = workbook.create_sheet("Cantidades decomisadas")
+    cantidades.append([f"Resumen de despacho lote {batch_number(lote_id)}"])
+    cantidades.append([])
+    for section_index, section in enumerate(SECTIONS):
+        cantidades.append([section])
+        cantidades.append(["Individuo", "Órgano", "Cantidad", "Unidad", "Fecha Registro"])
+        for individual in seized[section_index :: len(SECTIONS)]:
+            cantidades.append(
+                [
+                    f"{lote_id}-{individual}",
+                    rng.choice(ORGANS),
+                    round(rng.uniform(0.5, 10), 2),
+                    "kg",
+                    START + datetime.timedelta(minutes=454 + individual),
+                ]
+            )
+        cantidades.append([])
+
+    motivos = workbook.create_sheet("Motivos de decomisos")
+    motivos.append(["Motivos"])
+    motivos.append(["Individuo", "Organo", "Patología", "Decomiso Total", "Fecha Registro"])
+    for individual in seized:
+        motivos.append(
+            [
+                f"{lote_id}-{individual}",
+                rng.choice(ORGANS),
+                rng.choice(PATHOLOGIES),
+                rng.choice(["Si", "No"]),
+                START + datetime.timedelta(minutes=454 + individual),
+            ]
+        )
+
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
@@ -0,0 +1,222 @@
+"""
+Check and time services.sanitize against the former Client.sanitize_value.
+
+Property check: --cases random values are drawn from the characters that
+appear in Consec cells (digits, ".", ",", "$", "%", ":", "-", spaces,
+apostrophes, a few letters and non-ASCII digits) plus None, ints and
+floats. sanitize_value, sanitize_values and sanitize_rows must return, for
+every one of them, a value of the same type and repr as the former implementation,
+copied below as it was. The exit status is 1 on any difference.
+
+Microbenchmark: the former function, sanitize_value and sanitize_rows over
+--rows rows shaped like Consec: amounts, weights and dates differ from row
+to row, names and empty or constant cells repeat.
+
+Usage:
+    python benchmarks/sanitize_values.py --cases 200000 --rows 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sanitize import sanitize_rows, sanitize_value, sanitize_values  # noqa: E402
+
+CONSEC_ROW = [
+    "250627-6566",
+    "CARNES VITAL SAS",
+    "2025-07-22 09:49:08",
+    "15025",
+    "2119,9",
+    "$ 17.361.271",
+    "$ 1.252",
+    "82,7%",
+    "1:01:15",
+    "124,7",
+    "1.252",
+    "",
+    None,
+    "'0",
+    "$ 0",
+    "100%",
+]
+
+ALPHABET = "0123456789" * 3 + ".,$%:- '" * 2 + "aeE" + "٣²"
+
+
+def former_sanitize_value(value):
+    try:
+        if value is None:
+            return ""
+
+        if isinstance(value, (int, float)):
+            return value
+
+        # Convert to string and clean whitespace and leading apostrophes
+        value = str(value).strip().lstrip("'")
+
+        # Handle empty strings
+        if not value:
+            return ""
+
+        # Handle date-time format (contains both date and time)
+        if len(value.split("-")) == 3 and " " in value:
+            return value
+
+        # Handle time format (HH:MM:SS)
+        if value.count(":") == 2:
+            return value
+
+        # Handle currency values with $ symbol
+        if value.startswith("$"):
+            cleaned = (
+                value.replace("$", "").replace(".", "").replace(",", "").strip()
+            )
+            try:
+                return float(cleaned)
+            except ValueError:
+                return value
+
+        # Handle percentage values
+        if value.endswith("%"):
+            cleaned = value.rstrip("%").replace(",", ".")
+            try:
+                return float(cleaned) / 100
+            except ValueError:
+                return value
+
+        # Handle decimal numbers with comma
+        if "," in value:
+            cleaned = value.replace(",", ".")
+            try:
+                return float(cleaned)
+            except ValueError:
+                return value
+
+        # Handle regular numbers
+        try:
+            # Remove any thousand separators and try to convert
+            cleaned = value.replace(".", "")
+            if cleaned.isdigit():
+                return float(cleaned)
+        except ValueError:
+            pass
+
+        # If all else fails, return the original value
+        return value
+
+    except Exception:
+        return value
+
+
+def random_value(rng: random.Random):
+    kind = rng.random()
+    if kind < 0.05:
+        return None
+    if kind < 0.1:
+        return rng.randint(-1000, 1000)
+    if kind < 0.15:
+        return rng.uniform(-1000, 1000)
+    if kind < 0.5:
+        # Shapes seen in Consec, with random digits
+        digits = "".join(rng.choice("0123456789") for _ in range(rng.randint(1, 9)))
+        return rng.choice(
+            [
+                f"$ {int(digits):,}".replace(",", "."),
+                f"{digits[:-1] or '0'},{digits[-1]}%",
+                f"{digits[:-1] or '0'},{digits[-1]}",
+                f"{int(digits):,}".replace(",", "."),
+                f"{int(digits) % 24}:{int(digits) % 60:02d}:{int(digits) % 60:02d}",
+                f"2025-07-{int(digits) % 28 + 1:02d} 0{int(digits) % 10}:49:08",
+                f"'{digits}",
+                f" {digits} ",
+            ]
+        )
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 12)))
+
+
+def typical_row(rng: random.Random) -> list:
+    amount = rng.randint(1_000_000, 90_000_000)
+    weight = rng.randint(1000, 30000)
+    return [
+        f"25{rng.randint(1000, 1299)}-{rng.randint(6000, 7000)}",
+        rng.choice(["CARNES VITAL SAS", "CARNES COSTA AZUL", "FRIGORIFICO SAN JUAN"]),
+        f"2025-07-{rng.randint(1, 28):02d} 0{rng.randint(0, 9)}:49:08",
+        str(rng.randint(1, 400)),
+        f"{weight // 10},{weight % 10}",
+        f"$ {amount:,}".replace(",", "."),
+        f"$ {amount // 13:,}".replace(",", "."),
+        f"{rng.randint(70, 90)},{rng.randint(0, 9)}%",
+        f"{rng.randint(0, 2)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+        f"{rng.randint(80, 140)},{rng.randint(0, 9)}",
+        f"{weight:,}".replace(",", "."),
+        "",
+        None,
+        "'0",
+        "$ 0",
+        "100%",
+    ]
+
+
+def same(a, b) -> bool:
+    return type(a) is type(b) and repr(a) == repr(b)
+
+
+def check(cases: int, seed: int) -> int:
+    rng = random.Random(seed)
+    values = [random_value(rng) for _ in range(cases)] + CONSEC_ROW + typical_row(rng)
+    expected = [former_sanitize_value(value) for value in values]
+    batch = sanitize_values(values)
+    block = sanitize_rows([values])[0]
+    failures = 0
+    for value, want, got, cell in zip(values, expected, batch, block):
+        single = sanitize_value(value)
+        if not same(want, got) or not same(want, single) or not same(want, cell):
+            failures += 1
+            if failures <= 10:
+                print(f"{value!r}: expected {want!r}, got {single!r} / {got!r}")
+    print(f"{len(values)} values checked, {failures} differences")
+    return failures
+
+
+def timed(label: str, fn, count: int, baseline: float = None) -> float:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    speedup = f"   x{baseline / elapsed:.1f}" if baseline else ""
+    print(f"{label:<16} {elapsed * 1e9 / count:8.0f} ns/value{speedup}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cases", type=int, default=200000)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures = check(args.cases, args.seed)
+
+    rng = random.Random(args.seed)
+    rows = [typical_row(rng) for _ in range(args.rows)]
+    count = sum(len(row) for row in rows)
+    baseline = timed(
+        "former",
+        lambda: [[former_sanitize_value(value) for value in row] for row in rows],
+        count,
+    )
+    timed(
+        "sanitize_value",
+        lambda: [[sanitize_value(value) for value in row] for row in rows],
+        count,
+        baseline,
+    )
+    timed("sanitize_rows", lambda: sanitize_rows(rows), count, baseline)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
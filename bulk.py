@@ -0,0 +1,104 @@
+"""
+Process several lotes from the command line.
+
+Usage:
+    python bulk.py 250627-6566 250628-6570
+    python bulk.py --from 2025-07-01 --to 2025-07-03 --lote-workers 3
+
+Files go to downloads/<lote>/ like the web app's. Finished lotes are recorded
+in downloads/bulk_state.json and skipped when the command runs again.
+
+The Google rate limits (SHEETS_READS_PER_MINUTE, ...) are for the whole
+account but scheduled by this process alone: while the web app's workers use
+the same account, --quota-processes splits them between that many processes.
+"""
+import argparse
+import datetime
+import os
+import sys
+from logger_config import setup_logger
+from services.api import CGANService
+from services.bulk import BulkState, resolve_lotes, run_lotes
+from services.cache import ResponseCache
+from services.quota import QuotaScheduler, per_process_limits
+from services.transport import Transport
+
+logger = setup_logger()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("lotes", nargs="*", help="Lote numbers, e.g. 250627-6566")
+    parser.add_argument("--from", dest="start_date", type=datetime.date.fromisoformat)
+    parser.add_argument("--to", dest="end_date", type=datetime.date.fromisoformat)
+    parser.add_argument("--lote-workers", type=int, default=2)
+    parser.add_argument(
+        "--client-workers", type=int, default=int(os.environ.get("CLIENT_WORKERS", 4))
+    )
+    parser.add_argument(
+        "--quota-processes",
+        type=int,
+        default=1,
+        help="Processes sharing the Google per-minute limits, this one included",
+    )
+    parser.add_argument("--state", default="downloads/bulk_state.json")
+    parser.add_argument(
+        "--refresh", action="store_true", help="Ignore cached INFOCGAN responses"
+    )
+    parser.add_argument(
+        "--redo", action="store_true", help="Process finished lotes again"
+    )
+    args = parser.parse_args()
+
+    if bool(args.start_date) != bool(args.end_date):
+        parser.error("--from and --to go together")
+    if not args.lotes and not args.start_date:
+        parser.error("give lote numbers or a --from/--to range")
+    # Like app.py: the local backend evaluates no formulas, its Consecutivos
+    # rows and PDFs would come out empty
+    if os.environ.get("EXCEL_BACKEND", "sheets") != "sheets":
+        parser.error("EXCEL_BACKEND=local can't process real lotes, use sheets")
+
+    cgan_service = CGANService(
+        backend="sheets",
+        cache=ResponseCache(os.environ.get("CACHE_DIR", "cache/infocgan")),
+        transport=Transport(),
+        quota=QuotaScheduler(
+            per_process_limits(
+                {
+                    "sheets:read": int(os.environ.get("SHEETS_READS_PER_MINUTE", 60)),
+                    "sheets:write": int(os.environ.get("SHEETS_WRITES_PER_MINUTE", 60)),
+                    "drive:read": int(os.environ.get("DRIVE_CALLS_PER_MINUTE", 300)),
+                    "drive:write": int(os.environ.get("DRIVE_CALLS_PER_MINUTE", 300)),
+                },
+                args.quota_processes,
+            )
+        ),
+    )
+    if not cgan_service.login():
+        logger.error("Could not log in to INFOCGAN")
+        return 1
+
+    try:
+        lotes = resolve_lotes(cgan_service, args.lotes, args.start_date, args.end_date)
+    except LookupError as e:
+        logger.error(str(e))
+        return 1
+
+    outcomes = run_lotes(
+        cgan_service,
+        lotes,
+        BulkState(args.state),
+        lote_workers=args.lote_workers,
+        client_workers=args.client_workers,
+        force_refresh=args.refresh,
+        redo=args.redo,
+    )
+    for batch_number, outcome in outcomes.items():
+        print(f"{batch_number:<16} {outcome}")
+    failed = [outcome for outcome in outcomes.values() if outcome not in ("done", "skipped")]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, SelectField
+from wtforms import StringField, SubmitField, SelectField, BooleanField
 from wtforms.validators import DataRequired, Regexp
 
 
@@ -11,4 +11,6 @@ class LoteForm(FlaskForm):
         ],
     )
 
+    refresh = BooleanField("Forzar actualización desde INFOCGAN")
+
     submit = SubmitField("Consultar")
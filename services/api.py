@@ -1,24 +1,66 @@
-import requests
 import datetime
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from logger_config import setup_logger
+from services import metrics
+from services.cache import ResponseCache
 from services.excel import Client
+from services.quota import QuotaScheduler
+from services.transport import Transport
 
 logger = setup_logger()
 
 
 class CGANService:
-    def __init__(self):
+    def __init__(
+        self,
+        backend: str = "sheets",
+        batches_ttl: int = 600,
+        cache: ResponseCache = None,
+        cache_max_age: int = 600,
+        transport: Transport = None,
+        quota: QuotaScheduler = None,
+    ):
+        """
+        Args:
+            backend: Client backend, "sheets" or "local" (offline work
+                only, see services.excel.Client)
+            batches_ttl: Seconds the batch number -> id map is reused before
+                it is fetched again in full
+            cache: On-disk cache of lote responses, ResponseCache() by default
+            cache_max_age: Seconds a cached lote response is used without
+                asking INFOCGAN; older entries are revalidated
+            transport: HTTP transport, Transport() by default. Its 401
+                handler is set to login()
+            quota: Rate limits of the client's Sheets and Drive calls
+        """
         self.login_url = "https://infocgan.cloudmantum.com/api/login"
         self.api_url = "https://api-infocgan.cloudmantum.com/api/"
+        # Generated files are served from the API host, outside /api/
+        self.storage_url = "https://api-infocgan.cloudmantum.com/"
         self.token = None
-        self.session = requests.Session()
-        self.api_client = Client()
+        self.transport = transport if transport is not None else Transport()
+        self.transport.on_unauthorized = self.login
+        self.session = self.transport.session
+        self.api_client = Client(backend=backend, quota=quota)
+        self.batches_ttl = batches_ttl
+        self._batches = {}
+        self._batches_fetched_at = None
+        self._batches_last_date = None
+        self._batches_lock = threading.Lock()
+        self.cache = cache if cache is not None else ResponseCache()
+        self.cache_max_age = cache_max_age
 
     def login(self) -> bool:
         try:
             logger.info("Attempting to connect to INFOCGAN API")
-            response = self.session.post(
+            response = self.transport.post(
                 self.login_url,
+                endpoint="login",
+                idempotent=True,
+                authenticate=False,
                 json={"username": "ivan.echeverri", "password": "83006661"},
             )
             response.raise_for_status()
@@ -41,35 +83,109 @@ class CGANService:
                 logger.error("Login failed.")
             return False
 
-    def get_lote_detail(self, lote: int) -> dict:
+    def warm_up(self) -> bool:
+        """
+        Log in and open the template ahead of the first lote. Nothing of
+        this runs at import; /ready starts it in the background.
+        """
+        if not self.token:
+            self.login()
+        try:
+            self.api_client.worksheets.worksheets()
+        except Exception as e:
+            logger.error(f"Could not open the template spreadsheet: {str(e)}")
+        return self.ready
+
+    @property
+    def ready(self) -> bool:
+        """Logged in to INFOCGAN and template spreadsheet opened"""
+        return bool(self.token) and self.api_client.ready
+
+    def _fresh_cache_entry(self, key: str) -> dict:
+        entry = self.cache.get(key)
+        if entry and time.time() - entry["stored_at"] < self.cache_max_age:
+            return entry
+        return None
+
+    def _cached_get(
+        self,
+        key: str,
+        url: str,
+        endpoint: str,
+        timeout: float = None,
+        force_refresh: bool = False,
+    ) -> bytes:
+        """
+        GET a lote resource through the on-disk cache.
+
+        A fresh entry is returned without any request. A stale one is
+        revalidated with If-None-Match / If-Modified-Since when the API sent
+        validators, and reused on 304 Not Modified.
+        """
+        entry = None if force_refresh else self.cache.get(key)
+        if entry and time.time() - entry["stored_at"] < self.cache_max_age:
+            logger.info(f"Using cached response for {key}")
+            return entry["content"]
+
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.transport.get(
+            url, endpoint=endpoint, timeout=timeout, headers=headers
+        )
+        if entry and response.status_code == 304:
+            logger.info(f"Cached response for {key} is still valid")
+            self.cache.touch(key)
+            return entry["content"]
+        response.raise_for_status()
+
+        self.cache.put(
+            key,
+            response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return response.content
+
+    def get_lote_detail(
+        self, lote: int, timeout: float = None, force_refresh: bool = False
+    ) -> dict:
         try:
             logger.info(f"Querying lote number {lote}")
-            response = self.session.get(
+            content = self._cached_get(
+                f"{lote}:batch",
                 f"{self.api_url}batch/{lote}",
-                headers=self.session.headers,
+                "batch",
+                timeout,
+                force_refresh,
             )
-            response.raise_for_status()
             logger.info(f"Lote {lote} queried succesfully.")
 
-            # logger.debug(response.json())
-
-            return response.json()
+            return json.loads(content)
         except Exception as e:
+            logger.error(f"Error querying lote {lote}: {e}")
             return None
 
-    def get_lote_individuals(self, lote: int) -> dict:
+    def get_lote_individuals(
+        self, lote: int, timeout: float = None, force_refresh: bool = False
+    ) -> dict:
         try:
             logger.info(f"Querying individuals for lote number {lote}")
-            response = self.session.get(
+            content = self._cached_get(
+                f"{lote}:monitoring/individuals",
                 f"{self.api_url}monitoring/individuals/{lote}",
-                headers=self.session.headers,
+                "monitoring/individuals",
+                timeout,
+                force_refresh,
             )
-            response.raise_for_status()
             logger.info("Individuales queried successfully.")
-            # logger.debug(response.json())
-            return response.json()
+            return json.loads(content)
 
         except Exception as e:
+            logger.error(f"Error querying individuals for lote {lote}: {e}")
             return None
 
     """
@@ -77,30 +193,101 @@ class CGANService:
     user deals with lote number while devs deal with lote id to interact with the API.
     """
 
-    def get_batches(self) -> dict:
+    def search_batches(self, start_date: datetime.date, end_date: datetime.date) -> dict:
+        """
+        Query the batches created between two dates (inclusive).
+
+        Returns:
+            dict: {batch number: batch id}
+            None: Si hubo error
+        """
         try:
-            start_date = (
-                datetime.datetime.today() - datetime.timedelta(days=30)
-            ).strftime("%Y-%m-%d")
-            end_date = datetime.datetime.today().strftime("%Y-%m-%d")
-            logger.info("Retrieving batches")
-            response = self.session.post(
+            logger.info(f"Retrieving batches from {start_date} to {end_date}")
+            # A search has no side effects, so it is safe to retry
+            response = self.transport.post(
                 f"{self.api_url}batch/search",
-                headers=self.session.headers,
-                data={"startdate": start_date, "enddate": end_date, "specie": 1},
+                endpoint="batch/search",
+                idempotent=True,
+                data={
+                    "startdate": start_date.strftime("%Y-%m-%d"),
+                    "enddate": end_date.strftime("%Y-%m-%d"),
+                    "specie": 1,
+                },
             )
             response.raise_for_status()
 
             batches = {elem["batch"]: elem["id"] for elem in response.json()["body"]}
 
             logger.info("Batches queried successfully.")
-            # logger.info(batches)
             return batches
         except Exception as e:
             logger.error("Error while retrieving batches.")
             logger.error(e)
 
-    def get_dispatch_summary_path(self, lote_id: int) -> str:
+    def _refresh_batches(self, full: bool) -> None:
+        """
+        Fill the batches cache. A full refresh replaces it with the last 30
+        days, otherwise only the days since the last fetch are queried.
+        Must be called holding _batches_lock.
+        """
+        today = datetime.date.today()
+        if full or self._batches_last_date is None:
+            start_date = today - datetime.timedelta(days=30)
+        else:
+            # The last fetched day is queried again, it may have new batches
+            start_date = self._batches_last_date
+
+        batches = self.search_batches(start_date, today)
+        if batches is None:
+            return
+
+        if full or self._batches_last_date is None:
+            self._batches = batches
+            self._batches_fetched_at = time.monotonic()
+        else:
+            self._batches.update(batches)
+        self._batches_last_date = today
+
+    def _batches_expired(self) -> bool:
+        return (
+            self._batches_fetched_at is None
+            or time.monotonic() - self._batches_fetched_at > self.batches_ttl
+        )
+
+    def get_batches(self, force_refresh: bool = False) -> dict:
+        """
+        Batch number -> id map of the last 30 days, cached for batches_ttl
+        seconds.
+        """
+        with self._batches_lock:
+            if force_refresh or self._batches_expired():
+                self._refresh_batches(full=True)
+            return dict(self._batches)
+
+    def get_batch_id(self, batch_number: str) -> int:
+        """
+        Resolve the id of a batch number. Known batches cost no request, an
+        unknown one triggers an incremental refresh of the cache.
+
+        Returns:
+            int: Batch id
+            None: Si el lote no existe o hubo error
+        """
+        with self._batches_lock:
+            if self._batches_expired():
+                self._refresh_batches(full=True)
+            elif batch_number not in self._batches:
+                self._refresh_batches(full=False)
+            return self._batches.get(batch_number)
+
+    def invalidate_batches(self) -> None:
+        """Drop the cached batches, the next lookup fetches them again"""
+        with self._batches_lock:
+            self._batches = {}
+            self._batches_fetched_at = None
+            self._batches_last_date = None
+
+    def get_dispatch_summary_path(self, lote_id: int, timeout: float = None) -> str:
         """
         Genera el informe de resumen de despacho y retorna el path del Excel.
 
@@ -113,9 +300,10 @@ class CGANService:
         """
         try:
             logger.info(f"Requesting dispatch summary for lote_id {lote_id}")
-            response = self.session.get(
+            response = self.transport.get(
                 f"{self.api_url}summary/dispatch/{lote_id}",
-                headers=self.session.headers,
+                endpoint="summary/dispatch",
+                timeout=timeout,
             )
             response.raise_for_status()
             data = response.json()
@@ -130,7 +318,13 @@ class CGANService:
             logger.error(f"Error getting dispatch summary path: {e}")
             return None
 
-    def download_dispatch_summary(self, path: str) -> bytes:
+    def download_dispatch_summary(
+        self,
+        path: str,
+        timeout: float = None,
+        cache_key: str = None,
+        force_refresh: bool = False,
+    ) -> bytes:
         """
         Descarga el archivo Excel del resumen de despacho.
 
@@ -139,6 +333,9 @@ class CGANService:
 
         Args:
             path: Path relativo del archivo (ej: "storage/80-resumen-despacho-xxx.xlsx")
+            timeout: Segundos máximos de la descarga (por defecto los del transporte)
+            cache_key: Si se indica, la descarga pasa por el caché en disco
+            force_refresh: Ignora el caché y descarga de nuevo
 
         Returns:
             bytes: Contenido del archivo Excel
@@ -150,47 +347,65 @@ class CGANService:
 
         try:
             # URL base SIN /api/
-            base_url = "https://api-infocgan.cloudmantum.com"
-            download_url = f"{base_url}/{path}"
+            download_url = f"{self.storage_url}{path}"
 
             logger.info(f"Downloading dispatch summary from: {download_url}")
-            response = self.session.get(
-                download_url,
-                headers=self.session.headers,
-                timeout=60
-            )
-            response.raise_for_status()
+            if cache_key:
+                content = self._cached_get(
+                    cache_key, download_url, "storage", timeout, force_refresh
+                )
+            else:
+                response = self.transport.get(
+                    download_url,
+                    endpoint="storage",
+                    timeout=timeout
+                )
+                response.raise_for_status()
+                content = response.content
 
-            logger.info(f"Downloaded {len(response.content)} bytes")
-            return response.content
+            logger.info(f"Downloaded {len(content)} bytes")
+            return content
         except Exception as e:
             logger.error(f"Error downloading dispatch summary: {e}")
             return None
 
-    def get_decomisos_data(self, lote_id: int) -> dict:
+    def get_decomisos_data(
+        self, lote_id: int, timeout: float = None, force_refresh: bool = False
+    ) -> dict:
         """
         Obtiene los datos de decomisos para un lote.
         Combina: obtener path + descargar + parsear
+        Si el Excel está fresco en el caché no se genera el informe de nuevo.
 
         Args:
             lote_id: ID numérico del lote
+            timeout: Segundos máximos por petición (por defecto los del transporte)
+            force_refresh: Ignora el caché y consulta INFOCGAN
 
         Returns:
             dict: {"cantidades": [...], "motivos": [...]}
             None: Si hubo error
         """
         try:
-            # 1. Obtener path del Excel
-            path = self.get_dispatch_summary_path(lote_id)
-            if not path:
-                logger.error("Could not get dispatch summary path")
-                return None
+            cache_key = f"{lote_id}:summary/dispatch"
+            cached = None if force_refresh else self._fresh_cache_entry(cache_key)
+            if cached:
+                logger.info(f"Using cached dispatch summary for lote_id {lote_id}")
+                excel_bytes = cached["content"]
+            else:
+                # 1. Obtener path del Excel
+                path = self.get_dispatch_summary_path(lote_id, timeout)
+                if not path:
+                    logger.error("Could not get dispatch summary path")
+                    return None
 
-            # 2. Descargar el Excel
-            excel_bytes = self.download_dispatch_summary(path)
-            if not excel_bytes:
-                logger.error("Could not download dispatch summary")
-                return None
+                # 2. Descargar el Excel
+                excel_bytes = self.download_dispatch_summary(
+                    path, timeout, cache_key=cache_key, force_refresh=force_refresh
+                )
+                if not excel_bytes:
+                    logger.error("Could not download dispatch summary")
+                    return None
 
             # 3. Parsear el Excel
             decomisos_data = self.api_client.parse_decomisos_excel(excel_bytes)
@@ -200,3 +415,38 @@ class CGANService:
         except Exception as e:
             logger.error(f"Error getting decomisos data: {e}")
             return None
+
+    def fetch_lote(
+        self, lote_id: int, timeout: float = None, force_refresh: bool = False
+    ) -> dict:
+        """
+        Obtiene todo lo necesario para procesar un lote en paralelo.
+
+        El detalle, los individuos y los decomisos no dependen entre sí, así
+        que el tiempo total es el de la petición más lenta.
+
+        Args:
+            lote_id: ID numérico del lote
+            timeout: Segundos máximos por petición (por defecto los del transporte)
+            force_refresh: Ignora el caché y consulta INFOCGAN
+
+        Returns:
+            dict: {"lote": ..., "individuals": ..., "decomisos": ...}
+                con None en las consultas que fallaron
+        """
+        with metrics.timed("infocgan:fetch_lote"):
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                lote = metrics.submit(
+                    executor, self.get_lote_detail, lote_id, timeout, force_refresh
+                )
+                individuals = metrics.submit(
+                    executor, self.get_lote_individuals, lote_id, timeout, force_refresh
+                )
+                decomisos = metrics.submit(
+                    executor, self.get_decomisos_data, lote_id, timeout, force_refresh
+                )
+                return {
+                    "lote": lote.result(),
+                    "individuals": individuals.result(),
+                    "decomisos": decomisos.result(),
+                }
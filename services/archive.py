@@ -0,0 +1,195 @@
+"""
+Streaming zip archives of a lote's downloads folder.
+
+The archive is produced chunk by chunk into the HTTP response instead of being
+written to disk first. Members that are already compressed (xlsx, pdf, ...)
+are stored as they are; deflating them again only costs CPU. While streaming,
+the bytes are also written to a cache file tagged with a signature of the
+folder, so the next download of an unchanged folder is served from it.
+
+Only a single batch folder directly under downloads/ is archived. The
+archive is built in the system temp directory and moved next to the folder
+once complete, and zip, temp and signature files are never archived, so the
+archive can't end up reading itself.
+
+The time spent building the archive, not counting the time the client takes
+to read it, and its size are recorded in services.metrics under "zip".
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from logger_config import setup_logger
+from services import metrics
+
+logger = setup_logger()
+
+STORED_EXTENSIONS = {".xlsx", ".xlsm", ".pdf", ".zip", ".png", ".jpg", ".jpeg"}
+CHUNK_SIZE = 1024 * 1024
+DOWNLOADS_DIR = "downloads"
+# Left by this module (cached zips, their signatures, partial archives)
+SKIPPED_EXTENSIONS = {".zip", ".tmp", ".sig"}
+
+
+def batch_folder(batch: str, downloads_dir: str = DOWNLOADS_DIR) -> str:
+    """
+    Real path of the downloads folder of a batch.
+
+    Raises:
+        ValueError: batch is not a plain folder name, or the path resolves
+            (e.g. through a symlink) outside downloads_dir
+    """
+    if not batch or "/" in batch or "\\" in batch or ".." in batch or batch.startswith("."):
+        raise ValueError(f"Invalid batch name: {batch!r}")
+    root = os.path.realpath(downloads_dir)
+    folder = os.path.realpath(os.path.join(root, batch))
+    if os.path.dirname(folder) != root:
+        raise ValueError(f"Batch folder outside {downloads_dir}: {batch!r}")
+    return folder
+
+
+class _StreamSink:
+    """Unseekable file object that keeps what ZipFile writes until popped"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def list_files(folder_path: str) -> list:
+    """(file path, name inside the archive) of every file, sorted by name"""
+    files = []
+    for root, dirs, names in os.walk(folder_path):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in SKIPPED_EXTENSIONS:
+                continue
+            file_path = os.path.join(root, name)
+            files.append((file_path, os.path.relpath(file_path, folder_path)))
+    return sorted(files, key=lambda item: item[1])
+
+
+def folder_signature(folder_path: str) -> str:
+    """Changes whenever a file is added, removed or modified"""
+    digest = hashlib.sha256()
+    for file_path, arcname in list_files(folder_path):
+        stat = os.stat(file_path)
+        digest.update(f"{arcname}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def cached_zip(zip_path: str, signature: str) -> bool:
+    """Whether zip_path was built from a folder with this signature"""
+    try:
+        with open(f"{zip_path}.sig", "r") as f:
+            return f.read() == signature and os.path.exists(zip_path)
+    except FileNotFoundError:
+        return False
+
+
+def stream_zip(folder_path: str, zip_path: str = None, signature: str = None):
+    """
+    Chunks of a zip archive of folder_path, to iterate over.
+
+    Args:
+        folder_path: Batch folder to archive, names are relative to it
+        zip_path: If given, the archive is also saved there once complete
+        signature: folder_signature() stored next to zip_path
+
+    Raises:
+        ValueError: folder_path is not a batch folder under downloads/, or
+            zip_path is inside it
+    """
+    folder = os.path.realpath(folder_path)
+    if batch_folder(os.path.basename(folder)) != folder:
+        raise ValueError(f"Not a batch folder under {DOWNLOADS_DIR}: {folder_path}")
+    if zip_path and os.path.realpath(zip_path).startswith(folder + os.sep):
+        raise ValueError(f"Zip file {zip_path} inside the archived folder")
+    return _timed_chunks(_zip_chunks(folder, zip_path, signature))
+
+
+def _timed_chunks(chunks):
+    busy = 0.0
+    size = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                data = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                busy += time.perf_counter() - started
+            size += len(data)
+            yield data
+    finally:
+        chunks.close()
+        metrics.observe("zip", busy)
+        metrics.count("zip", size=size)
+
+
+def _zip_chunks(folder_path: str, zip_path: str, signature: str):
+    sink = _StreamSink()
+    tmp_path = (
+        os.path.join(tempfile.gettempdir(), f"comcer-{uuid.uuid4().hex}.zip.tmp")
+        if zip_path
+        else None
+    )
+    cache_file = open(tmp_path, "wb") if tmp_path else None
+    completed = False
+    try:
+        with zipfile.ZipFile(sink, "w") as zipf:
+            for file_path, arcname in list_files(folder_path):
+                zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+                extension = os.path.splitext(arcname)[1].lower()
+                zinfo.compress_type = (
+                    zipfile.ZIP_STORED
+                    if extension in STORED_EXTENSIONS
+                    else zipfile.ZIP_DEFLATED
+                )
+                with open(file_path, "rb") as src, zipf.open(zinfo, "w") as dest:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        dest.write(chunk)
+                        data = sink.pop()
+                        if data:
+                            if cache_file:
+                                cache_file.write(data)
+                            yield data
+                data = sink.pop()
+                if data:
+                    if cache_file:
+                        cache_file.write(data)
+                    yield data
+        # Central directory, written when the ZipFile closes
+        data = sink.pop()
+        if cache_file:
+            cache_file.write(data)
+        yield data
+        completed = True
+    finally:
+        if cache_file:
+            cache_file.close()
+            if completed:
+                # Stale until the new signature is written; the temp dir
+                # may be on another filesystem
+                if os.path.exists(f"{zip_path}.sig"):
+                    os.remove(f"{zip_path}.sig")
+                shutil.move(tmp_path, zip_path)
+                with open(f"{zip_path}.sig", "w") as f:
+                    f.write(signature or "")
+                logger.info(f"Cached zip file: {zip_path}")
+            else:
+                os.remove(tmp_path)
@@ -0,0 +1,201 @@
+"""
+Processing of many lotes in one run.
+
+End-of-day runs cover 20 or more lotes. run_lotes processes each one the way
+the web form does (fetch_lote, then process_lote on its own copy of the
+template), a bounded number of lotes at a time, and records every finished
+lote in a state file. Running it again over the same lotes skips the ones
+already done, so an interrupted run resumes where it stopped.
+
+A lote interrupted half way is processed again from the start; its files in
+downloads/<lote>/ are overwritten, but Consecutivos rows it had already
+appended stay there.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logger_config import setup_logger
+from services import metrics
+from services.pipeline import process_lote
+
+logger = setup_logger()
+
+
+class BulkState:
+    def __init__(self, path: str = "downloads/bulk_state.json"):
+        """
+        Args:
+            path: JSON file of the finished lotes, kept between runs
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._lotes = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Discarding unreadable bulk state: {e}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._lotes, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def done(self, batch_number: str) -> bool:
+        with self._lock:
+            return self._lotes.get(batch_number, {}).get("status") == "done"
+
+    def mark(self, batch_number: str, status: str, **details):
+        """Record the outcome of a lote and save the file right away"""
+        with self._lock:
+            self._lotes[batch_number] = {
+                "status": status,
+                "finished_at": time.time(),
+                **details,
+            }
+            self._save()
+
+
+def resolve_lotes(
+    cgan_service, batch_numbers: list = None, start_date=None, end_date=None
+) -> dict:
+    """
+    Batch number -> lote id of the lotes to process.
+
+    Args:
+        batch_numbers: Lote numbers as typed in the form, resolved through
+            get_batch_id (the cached map of the last 30 days)
+        start_date, end_date: Every lote created in this range (inclusive),
+            from a single batch search
+
+    Raises:
+        LookupError: A lote number does not exist or the search failed
+    """
+    lotes = {}
+    if start_date and end_date:
+        found = cgan_service.search_batches(start_date, end_date)
+        if found is None:
+            raise LookupError(f"Could not search lotes from {start_date} to {end_date}")
+        lotes.update(sorted(found.items()))
+    for batch_number in batch_numbers or []:
+        lote_id = cgan_service.get_batch_id(batch_number)
+        if not lote_id:
+            raise LookupError(f"Lote {batch_number} not found")
+        lotes[batch_number] = lote_id
+    return lotes
+
+
+def process_one(
+    cgan_service,
+    batch_number: str,
+    lote_id: int,
+    client_workers: int = 1,
+    force_refresh: bool = False,
+) -> dict:
+    """
+    Fetch a lote and process all its clients.
+
+    Returns:
+        dict: process_lote result
+
+    Raises:
+        RuntimeError: INFOCGAN did not return the lote or its individuals
+    """
+    lote_data = cgan_service.fetch_lote(lote_id, force_refresh=force_refresh)
+    if not lote_data["lote"] or not lote_data["individuals"]:
+        raise RuntimeError(f"Lote {batch_number} could not be fetched")
+    results_lote = lote_data["lote"]["body"]
+    results_individuals = lote_data["individuals"]["body"]
+    if not results_lote or not results_individuals:
+        raise RuntimeError(f"Lote {batch_number} has no data")
+    if not lote_data["decomisos"]:
+        logger.warning(f"No se pudieron obtener datos de decomisos para lote {batch_number}")
+
+    clients = list(cgan_service.api_client.get_clients(results_lote))
+    logger.info(f"Clients for lote {batch_number}: {clients}")
+    return process_lote(
+        cgan_service.api_client,
+        clients,
+        results_lote,
+        results_individuals,
+        lote_data["decomisos"],
+        max_workers=client_workers,
+        progress=lambda message: logger.info(f"[{batch_number}] {message}"),
+    )
+
+
+def run_lotes(
+    cgan_service,
+    lotes: dict,
+    state: BulkState,
+    lote_workers: int = 2,
+    client_workers: int = 1,
+    force_refresh: bool = False,
+    redo: bool = False,
+) -> dict:
+    """
+    Process lotes with at most lote_workers of them at the same time.
+
+    Args:
+        lotes: Batch number -> lote id, see resolve_lotes
+        state: Finished lotes, skipped unless redo is set
+        lote_workers: Lotes processed at the same time
+        client_workers: Clients of a lote processed at the same time
+        force_refresh: Ignore the INFOCGAN response cache
+        redo: Process lotes the state already marks as done
+
+    Returns:
+        dict: Batch number -> "done", "skipped" or the error message
+    """
+    outcomes = {}
+    pending = {}
+    for batch_number, lote_id in lotes.items():
+        if not redo and state.done(batch_number):
+            logger.info(f"Lote {batch_number} already processed, skipping")
+            outcomes[batch_number] = "skipped"
+        else:
+            pending[batch_number] = lote_id
+
+    def run(batch_number, lote_id):
+        started = time.monotonic()
+        try:
+            with metrics.collect() as lote_metrics:
+                result = process_one(
+                    cgan_service, batch_number, lote_id, client_workers, force_refresh
+                )
+        except Exception as e:
+            logger.exception(f"Lote {batch_number} failed")
+            state.mark(batch_number, "failed", error=str(e))
+            return str(e)
+        timings = lote_metrics.summary()
+        logger.info(f"Lote {batch_number} timings: {metrics.describe(timings)}")
+        state.mark(
+            batch_number,
+            "done",
+            batch=result["batch"],
+            clients=result["clients"],
+            seconds=round(time.monotonic() - started, 1),
+            timings=timings,
+        )
+        return "done"
+
+    logger.info(f"Processing {len(pending)} lotes with {lote_workers} workers")
+    with ThreadPoolExecutor(max_workers=max(1, lote_workers)) as executor:
+        futures = {
+            batch_number: executor.submit(run, batch_number, lote_id)
+            for batch_number, lote_id in pending.items()
+        }
+        for batch_number, future in futures.items():
+            outcomes[batch_number] = future.result()
+    return outcomes
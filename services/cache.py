@@ -0,0 +1,210 @@
+"""
+Persistent cache of raw INFOCGAN responses.
+
+Entries are keyed by lote id and endpoint; their content is stored once per
+SHA-256 digest under blobs/, so identical responses share the same file. An
+index.json keeps the validators (ETag / Last-Modified) used to revalidate an
+entry and the last access time used for LRU eviction once the total size
+exceeds max_bytes. The folder is only created when something is first
+written, so building a cache (e.g. when the app is imported) touches no disk.
+
+Several processes (app workers, bulk.py) may share the folder. Writes take
+an exclusive lock on index.json.lock, apply their change to the index read
+back from disk and replace it through a temporary file of their own. Reads only update the
+in-memory index; their access times reach the disk with the next write.
+Disk errors are logged and never fail a request: the entry is just missing.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from logger_config import setup_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of one process are serialized
+    fcntl = None
+
+logger = setup_logger()
+
+
+class ResponseCache:
+    def __init__(self, directory: str = "cache/infocgan", max_bytes: int = 200 * 1024 * 1024):
+        """
+        Args:
+            directory: Folder holding index.json and the blobs
+            max_bytes: Size cap of the stored blobs
+        """
+        self.directory = directory
+        self.blobs_dir = os.path.join(directory, "blobs")
+        self.index_path = os.path.join(directory, "index.json")
+        self.lock_path = os.path.join(directory, "index.json.lock")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Modification time of the index.json self._index was read from
+        self._index_mtime = None
+        self._index = {}
+        self._reload_index()
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Discarding unreadable cache index: {e}")
+            return {}
+
+    def _reload_index(self):
+        """Read index.json again if another process replaced it"""
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._index_mtime:
+            return
+        index = self._read_index()
+        # Access times of reads not saved yet are kept
+        for key, entry in index.items():
+            known = self._index.get(key)
+            if known and known["blob"] == entry["blob"]:
+                entry["accessed_at"] = max(entry["accessed_at"], known["accessed_at"])
+        self._index = index
+        self._index_mtime = mtime
+
+    def _make_dirs(self):
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+    @contextmanager
+    def _writing(self):
+        """Hold the index, between threads and processes, and save it on exit"""
+        with self._lock:
+            self._make_dirs()
+            with open(self.lock_path, "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._reload_index()
+                    yield
+                    self._save_index()
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _replace(self, path: str, data: bytes):
+        """Write path atomically through a temporary file of its own"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _save_index(self):
+        self._replace(self.index_path, json.dumps(self._index).encode())
+        self._index_mtime = os.stat(self.index_path).st_mtime_ns
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest)
+
+    def get(self, key: str) -> dict:
+        """
+        Returns:
+            dict: {"content", "etag", "last_modified", "stored_at"}
+            None: Si la entrada no existe
+        """
+        with self._lock:
+            self._reload_index()
+            entry = self._index.get(key)
+            if not entry:
+                return None
+            try:
+                with open(self._blob_path(entry["blob"]), "rb") as f:
+                    content = f.read()
+            except OSError as e:
+                # Evicted by another process, or unreadable
+                logger.warning(f"Cached response for {key} is gone: {e}")
+                self._index.pop(key, None)
+                return None
+            entry["accessed_at"] = time.time()
+            return {
+                "content": content,
+                "etag": entry.get("etag"),
+                "last_modified": entry.get("last_modified"),
+                "stored_at": entry["stored_at"],
+            }
+
+    def put(self, key: str, content: bytes, etag: str = None, last_modified: str = None):
+        digest = hashlib.sha256(content).hexdigest()
+        try:
+            with self._writing():
+                blob_path = self._blob_path(digest)
+                if not os.path.exists(blob_path):
+                    self._replace(blob_path, content)
+
+                previous = self._index.get(key)
+                now = time.time()
+                self._index[key] = {
+                    "blob": digest,
+                    "size": len(content),
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "stored_at": now,
+                    "accessed_at": now,
+                }
+                if previous and previous["blob"] != digest:
+                    self._drop_blob_if_unused(previous["blob"])
+                self._evict()
+        except OSError as e:
+            logger.error(f"Could not cache the response for {key}: {e}")
+
+    def touch(self, key: str):
+        """Mark an entry as just revalidated (304 Not Modified)"""
+        try:
+            with self._writing():
+                entry = self._index.get(key)
+                if entry:
+                    entry["stored_at"] = entry["accessed_at"] = time.time()
+        except OSError as e:
+            logger.error(f"Could not refresh the cached response for {key}: {e}")
+
+    def invalidate(self, prefix: str = ""):
+        """Drop every entry whose key starts with prefix (all by default)"""
+        try:
+            with self._writing():
+                for key in [key for key in self._index if key.startswith(prefix)]:
+                    digest = self._index.pop(key)["blob"]
+                    self._drop_blob_if_unused(digest)
+        except OSError as e:
+            logger.error(f"Could not invalidate cached responses {prefix!r}: {e}")
+    def _drop_blob_if_unused(self, digest: str):
+        if any(entry["blob"] == digest for entry in self._index.values()):
+            return
+        try:
+            os.remove(self._blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        # Blobs shared by several keys are counted once
+        sizes = {entry["blob"]: entry["size"] for entry in self._index.values()}
+        total = sum(sizes.values())
+        for key, entry in sorted(
+            self._index.items(), key=lambda item: item[1]["accessed_at"]
+        ):
+            if total <= self.max_bytes:
+                break
+            del self._index[key]
+            if not any(other["blob"] == entry["blob"] for other in self._index.values()):
+                total -= entry["size"]
+                self._drop_blob_if_unused(entry["blob"])
+            logger.info(f"Evicted {key} from the response cache")
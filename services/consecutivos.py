@@ -0,0 +1,61 @@
+"""
+Appending rows to the Consecutivos spreadsheet.
+
+Consecutivos is the shared history of every liquidación and only grows.
+ConsecutivosWriter opens it once and keeps the handle of its first tab.
+Each lote collects its own rows as clients finish (services.excel.Client)
+and sends them together through append() as a single values:append. The
+Sheets API places appended rows after the last row of the table itself, so
+nothing is read to find the next free row, and two lotes appending at the
+same time cannot write over each other.
+
+The local backend has no Google access: its Consecutivos is the xlsx at
+LOCAL_CONSECUTIVOS_PATH, appended to the same way.
+"""
+import threading
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+CONSECUTIVOS_KEY = "12RXnw6ZBzgG4Yn0EvUZbgf2esJ-fFDdL-uEvcTpuS8w"
+LOCAL_CONSECUTIVOS_PATH = "downloads/Consecutivos.xlsx"
+
+
+class ConsecutivosWriter:
+    def __init__(self, open_spreadsheet, key: str = CONSECUTIVOS_KEY):
+        """
+        Args:
+            open_spreadsheet: Opens a spreadsheet by key, e.g. the
+                open_by_key of a gspread client; called once
+            key: Key of the Consecutivos spreadsheet
+        """
+        self.open_spreadsheet = open_spreadsheet
+        self.key = key
+        self._lock = threading.Lock()
+        self._worksheet = None
+
+    @property
+    def worksheet(self):
+        """First tab of Consecutivos, opened on first use"""
+        with self._lock:
+            if self._worksheet is None:
+                self._worksheet = self.open_spreadsheet(self.key).sheet1
+            return self._worksheet
+
+    def append(self, rows: list) -> int:
+        """
+        Append rows in one request. Nothing is kept if it fails: the rows
+        belong to the lote that sent them, which gets the exception.
+
+        Returns:
+            int: Rows appended
+        """
+        if not rows:
+            return 0
+        self.worksheet.append_rows(
+            rows,
+            value_input_option="USER_ENTERED",
+            insert_data_option="INSERT_ROWS",
+        )
+        logger.info(f"Appended {len(rows)} rows to Consecutivos: {rows}")
+        return len(rows)
@@ -1,32 +1,54 @@
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.oauth2 import service_account
+import threading
 from logger_config import setup_logger
+from services.quota import QuotaScheduler
 
-creds = service_account.Credentials.from_service_account_file(
-    "credentials.json", scopes=["https://www.googleapis.com/auth/drive"]
-)
+_drive_service = None
+_drive_lock = threading.Lock()
 
-drive_service = build("drive", "v3", credentials=creds)
+
+def get_drive_service():
+    """Drive v3 client, built on first use (discovery is slow and needs network)"""
+    global _drive_service
+    with _drive_lock:
+        if _drive_service is None:
+            from googleapiclient.discovery import build
+            from google.oauth2 import service_account
+
+            creds = service_account.Credentials.from_service_account_file(
+                "credentials.json", scopes=["https://www.googleapis.com/auth/drive"]
+            )
+            _drive_service = build("drive", "v3", credentials=creds)
+        return _drive_service
 
 
 def upload_files(
-    path: str, folder_id: str = "1krWR2x7w2hmxbchPaZyBMknHmaduMiD4"
+    path: str,
+    folder_id: str = "1krWR2x7w2hmxbchPaZyBMknHmaduMiD4",
+    *,
+    quota: QuotaScheduler,
 ) -> str:
+    """
+    Args:
+        quota: Scheduler shared with the rest of the app's Google calls,
+            e.g. cgan_service.api_client.quota; a new one would not see them
+    """
     file_metadata = {
         "name": path.split("/")[-1],  # Usa el nombre del archivo
     }
     if folder_id:
         file_metadata["parents"] = [folder_id]  # Carpeta destino (opcional)
+    from googleapiclient.http import MediaFileUpload
+
     media = MediaFileUpload(
         path,
         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     )
-    file = (
-        drive_service.files()
+    request = (
+        get_drive_service()
+        .files()
         .create(body=file_metadata, media_body=media, fields="id")
-        .execute()
     )
+    file = quota.call("drive:write", request.execute)
 
     print(f"✅ Subido: {path} → ID: {file.get('id')}")
 
@@ -1,25 +1,144 @@
-import pandas as pd
+import copy
 import os
-import time
 import datetime
-import pypdf
-import pandas
-import shutil
-import pyexcel
 import gspread
-import gspread_dataframe
 import unicodedata
 import httplib2
 import urllib.parse
+from functools import cached_property, partial
 from io import BytesIO
 from gspread.utils import ExportFormat
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils import get_column_letter
 from logger_config import setup_logger
 from oauth2client.service_account import ServiceAccountCredentials
-from pathlib import Path
-from typing import List, Tuple, Union
-from services.drive import upload_files
+from typing import List, Union
+from services.consecutivos import (
+    CONSECUTIVOS_KEY,
+    LOCAL_CONSECUTIVOS_PATH,
+    ConsecutivosWriter,
+)
+from services.exports import ExportManager
+from services.lote import LoteContext
+from services.quota import QuotaScheduler, RateLimited, ScheduledHTTPClient
+from services.sanitize import sanitize_value, sanitize_values
+from services.worksheets import WorksheetRegistry, is_structure_error
+
+
+class WriteBuffer:
+    """
+    Collects cell writes and clears for a spreadsheet and sends them together.
+
+    Cleared cells are written as "" and written cells override earlier
+    clears, so a clear followed by an update of the same table becomes a
+    single write. Consecutive rows of a sheet are merged into one rectangular
+    range; cells inside it that were not touched are sent as null, which the
+    Sheets API leaves unchanged. flush() issues at most one values:batchClear
+    (whole-sheet clears) and one values:batchUpdate for the whole spreadsheet.
+    """
+
+    def __init__(
+        self,
+        spreadsheet,
+        exports: ExportManager = None,
+        worksheets: WorksheetRegistry = None,
+    ):
+        self.spreadsheet = spreadsheet
+        self.exports = exports
+        self.worksheets = worksheets
+        self.cells = {}
+        self.cleared_sheets = []
+
+    def _sheet_cells(self, sheet: str) -> dict:
+        return self.cells.setdefault(sheet, {})
+
+    def write(self, sheet: str, a1: str, values: list):
+        """Write a 2-D block of values starting at the top-left cell of a1"""
+        grid = gspread.utils.a1_range_to_grid_range(a1.split(":")[0])
+        cells = self._sheet_cells(sheet)
+        for row_offset, row in enumerate(values):
+            for col_offset, value in enumerate(row):
+                cells[
+                    (
+                        grid["startRowIndex"] + row_offset + 1,
+                        grid["startColumnIndex"] + col_offset + 1,
+                    )
+                ] = value
+
+    def clear(self, sheet: str, a1_range: str):
+        """Clear a bounded range such as "A2:R90" """
+        grid = gspread.utils.a1_range_to_grid_range(a1_range)
+        cells = self._sheet_cells(sheet)
+        for row in range(grid["startRowIndex"] + 1, grid["endRowIndex"] + 1):
+            for col in range(grid["startColumnIndex"] + 1, grid["endColumnIndex"] + 1):
+                cells[(row, col)] = ""
+
+    def clear_sheet(self, sheet: str):
+        """Clear every value of a sheet, dropping what was buffered for it"""
+        self.cleared_sheets.append(sheet)
+        self.cells[sheet] = {}
+
+    def ranges(self) -> list:
+        """Coalesced [{"range": ..., "values": ...}] of the buffered cells"""
+        data = []
+        for sheet, cells in self.cells.items():
+            # First and last column written in every row
+            spans = {}
+            for row, col in cells:
+                first, last = spans.get(row, (col, col))
+                spans[row] = (min(first, col), max(last, col))
+
+            blocks = []
+            for row in sorted(spans):
+                if blocks and blocks[-1][-1] == row - 1:
+                    blocks[-1].append(row)
+                else:
+                    blocks.append([row])
+
+            for block in blocks:
+                first_col = min(spans[row][0] for row in block)
+                last_col = max(spans[row][1] for row in block)
+                values = [
+                    [cells.get((row, col)) for col in range(first_col, last_col + 1)]
+                    for row in block
+                ]
+                a1 = (
+                    f"{gspread.utils.rowcol_to_a1(block[0], first_col)}:"
+                    f"{gspread.utils.rowcol_to_a1(block[-1], last_col)}"
+                )
+                data.append(
+                    {
+                        "range": gspread.utils.absolute_range_name(sheet, a1),
+                        "values": values,
+                    }
+                )
+        return data
+
+    def flush(self):
+        if self.cleared_sheets:
+            self.spreadsheet.values_batch_clear(
+                body={
+                    "ranges": [
+                        gspread.utils.absolute_range_name(sheet)
+                        for sheet in self.cleared_sheets
+                    ]
+                }
+            )
+        data = self.ranges()
+        try:
+            if data:
+                self.spreadsheet.values_batch_update(
+                    body={"valueInputOption": "RAW", "data": data}
+                )
+        except gspread.exceptions.APIError as e:
+            # A tab was renamed or deleted, cached handles are stale
+            if self.worksheets and is_structure_error(e):
+                self.worksheets.invalidate()
+            raise
+        if self.exports and (data or self.cleared_sheets):
+            self.exports.mark_dirty(
+                self.spreadsheet.id, set(self.cells) | set(self.cleared_sheets)
+            )
+        self.cells = {}
+        self.cleared_sheets = []
 
 
 class Client:
@@ -28,37 +147,136 @@ class Client:
         "https://www.googleapis.com/auth/drive",
     ]
 
-    def __init__(self):
+    def __init__(
+        self,
+        backend: str = "sheets",
+        quota: QuotaScheduler = None,
+    ):
+        """
+        Args:
+            backend: "sheets" fills the Google Sheets template, "local" fills
+                an in-memory copy of ./assets/base.xlsx with openpyxl and
+                appends Consecutivos rows to LOCAL_CONSECUTIVOS_PATH, without
+                any Google call. The local backend evaluates no formulas, so
+                the Consec row and the figures of exported PDFs come out
+                empty: it is for offline work on the fill steps, and app.py
+                and bulk.py refuse it for real lotes.
+            quota: Rate limits of the Sheets and Drive calls,
+                QuotaScheduler() by default
+        """
         self.benefit_day = None
         self.logger = setup_logger()
         self.batch: str = None
+        self.backend = backend
         self.path = "./assets/base.xlsx"
-        self.workbook = load_workbook(self.path)
         self.clients = []
-        self.creds = ServiceAccountCredentials.from_json_keyfile_name(
+        self.consecutivos = []
+        # Indexes of the lote, built by fill_info
+        self.lote: LoteContext = None
+        # Shared with the working copies so the counters cover the whole app
+        self.exports = ExportManager()
+        self.quota = quota if quota is not None else QuotaScheduler()
+        # Shared too, for the Consecutivos handle
+        self.consecutivos_writer = ConsecutivosWriter(self._open_consecutivos)
+        # Rows of this client's lote waiting for flush_consecutivos; every
+        # working copy starts its own
+        self.consecutivos_pending = []
+
+    # Credentials, the gspread client and the template are loaded on first
+    # use so that importing the app does no file or network work
+
+    @cached_property
+    def creds(self):
+        return ServiceAccountCredentials.from_json_keyfile_name(
             "credentials.json", self.scopes
         )
-        self.generated_files = []
-        self.sheets_api_client = gspread.authorize(self.creds)
-        self.spreadsheet = self.sheets_api_client.open_by_key(
+
+    @cached_property
+    def sheets_api_client(self):
+        # Every gspread request waits for its quota and retries 429s
+        return gspread.authorize(
+            self.creds, http_client=partial(ScheduledHTTPClient, quota=self.quota)
+        )
+
+    def _open_consecutivos(self, key: str):
+        if self.backend == "local":
+            from services.local_sheets import LocalSpreadsheet
+
+            return LocalSpreadsheet.open_file(LOCAL_CONSECUTIVOS_PATH, "Consecutivos")
+        return self.sheets_api_client.open_by_key(key)
+
+    @cached_property
+    def spreadsheet(self):
+        if self.backend == "local":
+            from services.local_sheets import LocalSpreadsheet
+
+            spreadsheet = LocalSpreadsheet(self.path)
+            # The Google template has a Decomisos tab that base.xlsx lacks
+            if "Decomisos" not in spreadsheet.workbook.sheetnames:
+                spreadsheet.add_worksheet("Decomisos")
+            return spreadsheet
+        return self.sheets_api_client.open_by_key(
             "18AMyp1SzQR_3xe7EAH5muotOkNMy7rJV73YVwfExbi8"
         )
-        self.consecutivos = []
 
-    def clear_sheet_range(
-        self,
-        worksheet,
-        start_row: int,
-        end_row: int,
-        start_col: str = "A",
-        end_col: str = "Z",
-    ):
-        range_to_clear = f"{start_col}{start_row}:{end_col}{end_row}"
-        worksheet.batch_clear([range_to_clear])
+    @cached_property
+    def worksheets(self) -> WorksheetRegistry:
+        return WorksheetRegistry(self.spreadsheet)
 
-    def fill_info(self, body: dict):
-        self.clients = []
-        worksheet = self.spreadsheet.worksheet("INFO")
+    @property
+    def ready(self) -> bool:
+        """Whether the template spreadsheet was already opened"""
+        return "spreadsheet" in self.__dict__
+
+    def working_copy(self, title: str):
+        """
+        Return a Client bound to a private copy of the current spreadsheet.
+
+        The copy keeps the lote data already loaded (batch, clients, the
+        LoteContext) and whatever was written to the template so far, so
+        it can be filled and exported without touching the shared template.
+
+        Args:
+            title: Name of the copied spreadsheet in Drive
+        """
+        worker = copy.copy(self)
+        worker.consecutivos_pending = []
+        if self.backend == "local":
+            worker.spreadsheet = self.spreadsheet.copy(title)
+        else:
+            worker.spreadsheet = self.sheets_api_client.copy(
+                self.spreadsheet.id, title=title, copy_comments=False
+            )
+        worker.worksheets = self.worksheets.rebind(worker.spreadsheet)
+        self.logger.info(f"Created working copy {title} ({worker.spreadsheet.id})")
+        return worker
+
+    def discard_working_copy(self):
+        """Delete the spreadsheet created by working_copy"""
+        self.exports.forget(self.spreadsheet.id)
+        if self.backend == "local":
+            return
+        try:
+            self.sheets_api_client.del_spreadsheet(self.spreadsheet.id)
+        except Exception as e:
+            self.logger.error(
+                f"Could not delete working copy {self.spreadsheet.id}: {str(e)}"
+            )
+
+    def get_clients(self, body: dict) -> set:
+        """Destination names of a lote, the clients that get their own files"""
+        if not body["dispatched"]:
+            return {""}
+        return {row["namedestination"] for row in body["dispatched"]}
+
+    def fill_info(self, body: dict, individuals: list = None):
+        """
+        Args:
+            body: Lote body returned by INFOCGAN
+            individuals: Individuals body of the lote, grouped by client
+                into despacho rows per client right away if given
+        """
+        writes = WriteBuffer(self.spreadsheet, self.exports, self.worksheets)
         self.batch = body["batch"]
 
         # Prepare all values in a single update
@@ -90,30 +308,18 @@ class Client:
             ("B12", body["databenefit"]["pcec"]),
         ]
 
-        # Convert to batch update format
-        cell_updates = []
         for cell_addr, value in cells_to_update:
-            col = gspread.utils.a1_to_rowcol(cell_addr)[1]
-            row = gspread.utils.a1_to_rowcol(cell_addr)[0]
-            cell_updates.append({"range": cell_addr, "values": [[value]]})
+            writes.write("INFO", cell_addr, [[value]])
 
-        # Execute single batch update
-        worksheet.batch_update(cell_updates)
-        self.logger.info("Filled info sheet successfully")
         self.logger.info("Clearing rows 18-25, columns A and D:J (preserving B:C for formulas)")
-        self.clear_sheet_range(worksheet, 18, 25, "A", "A")
-        self.clear_sheet_range(worksheet, 18, 25, "D", "J")
-
-        # Prepare all dispatch data in a single batch
-        batch_updates = []
+        writes.clear("INFO", "A18:A25")
+        writes.clear("INFO", "D18:J25")
 
         if body["dispatched"]:
             for idx, row in enumerate(body["dispatched"], start=18):
 
-                self.clients.append(row["namedestination"])
-                self.logger.info(row["namedestination"])
                 # Write batch to column A
-                batch_updates.append({"range": f"A{idx}", "values": [[body["batch"]]]})
+                writes.write("INFO", f"A{idx}", [[body["batch"]]])
                 # Write remaining data to columns D:J (skip B and C)
                 values = [
                     [
@@ -126,98 +332,27 @@ class Client:
                         body["customerinvoice"]["label"],
                     ]
                 ]
-                batch_updates.append({"range": f"D{idx}:J{idx}", "values": values})
-        else:
-            self.clients.append("")
-
-        worksheet.batch_update(batch_updates)
-        self.clients = set(self.clients)
-        self.get_dispatch_details(body)
-        self.get_vehicle_dispatch_dates(body)
-
-    def generate_temp_files(self):
-        try:
-            os.mkdir(f"./downloads/{self.batch}")
-        except FileExistsError:
-            shutil.rmtree(f"./downloads/{self.batch}")
-            os.mkdir(f"./downloads/{self.batch}")
-        for client in self.clients:
-            self.logger.info(f"Creating {self.batch}-{client}.xlsx")
-            self.logger.info(self.path)
-            shutil.copy(
-                self.path, f"./downloads/{self.batch}/{self.batch}-{client}.xlsx"
-            )
-            self.generated_files.append(
-                f"./downloads/{self.batch}/{self.batch}-{client}.xlsx"
-            )
-
-    def fill_files(self, results_lote, results_individual):
-        for client, path in zip(self.clients, self.generated_files):
-            workbook = load_workbook(path)
+                writes.write("INFO", f"D{idx}:J{idx}", values)
 
-            self.fill_info()
-            # 1. fill despacho
-            self.fill_despacho(workbook, results_individual, client, path)
-            # 2. fill liquidicación
-            self.fill_liquidacion(workbook, results_lote, client, path)
-
-            self.fill_sheet(client, path)
+        # Single values:batchUpdate for the whole sheet
+        writes.flush()
+        self.logger.info("Filled info sheet successfully")
+        self.clients = self.get_clients(body)
+        self.lote = LoteContext(body, individuals)
 
     def fill_despacho(self, body: list, client):
-        worksheet = self.spreadsheet.worksheet("despacho")
+        writes = WriteBuffer(self.spreadsheet, self.exports, self.worksheets)
         self.logger.info("Clearing despacho sheet")
-        self.clear_sheet_range(worksheet, 2, 90, "A", "R")
-
-        batch = body[0]["batch"].split("-")[1]
-        current_row = 2
-        # Prepare batch updates for all rows
-        batch_updates = []
-
-        for individual in body:
-            dest_value = individual["destination"]["value"]
-            self.logger.info(dest_value)
-            if client != individual["destination"]["label"]:
-                continue
-
-            dispatch_info = (
-                self.dispatch_details[dest_value]
-                if dest_value in self.dispatch_details.keys()
-                else None
-            )
-
-            plate = dispatch_info["plate"] if dispatch_info else None
-            code = dispatch_info["code"] if dispatch_info else None
-            load_dates = self.get_load_dates_by_plate(plate) if dispatch_info else None
-
-            # Create row values
-            row_values = [
-                load_dates[0] if dest_value else 0,  # A
-                load_dates[1] if dest_value else 0,  # B
-                f"{batch}-{individual['consecutive']}",  # C
-                "",  # D (empty)
-                individual["property"]["label"],  # E
-                individual["ppe"],  # F
-                individual["pcc"],  # G
-                "",  # H (empty)
-                individual["pcr"],  # I
-                individual["gd"],  # J
-                individual["ml"],  # K
-                individual["seurop"],  # L
-                individual["mc"],  # M
-                individual["mckg"],  # N
-                individual["indexpse"],  # O
-                individual["destination"]["label"] if dest_value else 0,  # P
-                plate if dest_value else 0,  # Q
-                code if dest_value else 0,  # R
-            ]
+        writes.clear("despacho", "A2:R90")
 
-            # Add to batch updates
-            batch_updates.append(
-                {"range": f"A{current_row}:R{current_row}", "values": [row_values]}
-            )
-            current_row += 1
+        # Built for every client in one pass over the individuals
+        client_rows = self.lote.despacho_rows(body, client)
+        if client_rows:
+            writes.write("despacho", "A2", client_rows)
+        current_row = 2 + len(client_rows)
         self.count = current_row - 18
-        worksheet.batch_update(batch_updates)
+        # Clear and rows go out as one rectangular range
+        writes.flush()
         self.logger.info(f"Updated second sheet successfully for client {client}")
 
     def get_consecutivo(self, workbook, path):
@@ -226,90 +361,26 @@ class Client:
         for row in worksheet.iter_rows(values_only=True):
             self.logger.info(row)
 
-    def get_vehicle_dispatch_dates(self, body: dict):
-        # vehicle plates
-        vehicles = []
-
-        for dispatch in body["dispatched"]:
-            for vehicle_dispatch in dispatch["vehiclesdispatch"]:
-                vehicle = {
-                    "plate": vehicle_dispatch["plate"],
-                    "start_date": vehicle_dispatch["startdate"],
-                    "end_date": vehicle_dispatch["enddate"],
-                }
-                vehicles.append(vehicle)
-        self.logger.info("Getting vehicles")
-        self.vehicles = vehicles
-
     def get_load_dates_by_plate(self, plate) -> tuple:
-        try:
-            if self.vehicles:
-                vehicle = list(filter(lambda x: x["plate"] == plate, self.vehicles))[0]
-                return (vehicle["start_date"], vehicle["end_date"])
-        except Exception as e:
-            self.logger.error(e)
-            self.logger.error(f"Could not find vehicle for plate {plate}")
-            return ("?", "?")
-
-    def get_dispatch_details(self, body: dict) -> dict:
-        self.logger.info("Finding dispatch details")
-        self.dispatch_details = {
-            elem["iddestination"]: {
-                "name": elem["namedestination"],
-                "plate": elem["dispatchvehicle"]["plate"],
-                "code": elem["dispatch"]["code"],
-            }
-            for elem in body["dispatched"]
-        }
+        return self.lote.load_dates(plate)
 
     def get_load_dates_by_client(self, client: str) -> tuple:
         """Get load dates for a specific client using their dispatch details"""
-        try:
-            # Find dispatch details for this client
-            client_dispatch = next(
-                (
-                    dispatch
-                    for dispatch in self.dispatch_details.values()
-                    if dispatch["name"].strip().upper() == client.strip().upper()
-                ),
-                None,
-            )
-
-            if not client_dispatch:
-                self.logger.warning(f"No dispatch found for client: {client}")
-                return ("?", "?")
-
-            # Get the plate from client's dispatch
-            client_plate = client_dispatch["plate"]
-
-            # Find vehicle info for this plate
-            vehicle = next(
-                (v for v in self.vehicles if v["plate"] == client_plate), None
-            )
-
-            if vehicle:
-                self.logger.info(f"Found vehicle dates for client {client}: {vehicle}")
-                return (vehicle["start_date"], vehicle["end_date"])
-            else:
-                self.logger.warning(f"No vehicle found with plate {client_plate}")
-                return ("?", "?")
-
-        except Exception as e:
-            self.logger.error(f"Error getting load dates: {str(e)}")
+        client_dispatch = self.lote.client_dispatch(client)
+        if not client_dispatch:
+            self.logger.warning(f"No dispatch found for client: {client}")
             return ("?", "?")
 
+        load_dates = self.lote.load_dates(client_dispatch["plate"])
+        self.logger.info(f"Found vehicle dates for client {client}: {load_dates}")
+        return load_dates
+
     def fill_liquidacion(self, body: list, client):
         # llegada L4
         # liquidacion L6
         # sacrificio L7
-        worksheet = self.spreadsheet.worksheet("lIQUIDACION")
         self.logger.info(f"Filling register for client {client}")
         start_date, end_date = self.get_load_dates_by_client(client)
-        client_dispatch = None
-        for dispatch in self.dispatch_details.values():
-            if dispatch["name"].strip().upper() == client.strip().upper():
-                client_dispatch = dispatch
-                break
         # Prepare batch update for liquidacion fields
         batch_updates = [
             {"range": "L4", "values": [[body["register"]["createdAt"]]]},
@@ -320,52 +391,41 @@ class Client:
             {"range": "L8", "values": [[end_date]]},
         ]
 
-        self.logger.debug(self.vehicles)
-        self.logger.debug(self.dispatch_details)
+        self.logger.debug(self.lote.load_dates_by_plate)
+        self.logger.debug(self.lote.dispatch_by_destination)
         # Execute batch update
-        worksheet.batch_update(batch_updates)
+        writes = WriteBuffer(self.spreadsheet, self.exports, self.worksheets)
+        for update in batch_updates:
+            writes.write("lIQUIDACION", update["range"], update["values"])
+        writes.flush()
 
         # Store benefit day for later use
         self.benefit_day = body["databenefit"]["datebenefit"]
 
     def get_worksheet_by_titles(self, preferred_titles: List[str]):
-        def normalize_title(title: str) -> str:
-            return (
-                unicodedata.normalize("NFKD", title)
-                .encode("ascii", "ignore")
-                .decode("ascii")
-                .strip()
-                .casefold()
-            )
-
-        normalized_targets = [normalize_title(title) for title in preferred_titles]
-        worksheets = self.spreadsheet.worksheets()
-        worksheet_map = {
-            normalize_title(worksheet.title): worksheet
-            for worksheet in worksheets
-        }
-
-        for target in normalized_targets:
-            worksheet = worksheet_map.get(target)
-            if worksheet:
-                return worksheet
-
-        available_titles = [worksheet.title for worksheet in worksheets]
-        raise gspread.exceptions.WorksheetNotFound(
-            f"Worksheet not found. Tried: {preferred_titles}. Available: {available_titles}"
-        )
+        return self.worksheets.find(preferred_titles)
 
     def export_worksheet_pdf(self, worksheet) -> bytes:
+        if self.backend == "local":
+            return self.spreadsheet.export_worksheet_pdf(worksheet)
         export_url = f"https://docs.google.com/spreadsheets/d/{self.spreadsheet.id}/export"
         params = {"format": "pdf", "gid": worksheet.id}
         url = f"{export_url}?{urllib.parse.urlencode(params)}"
-        http = self.creds.authorize(httplib2.Http())
-        response, content = http.request(url, "GET")
-        if int(response.status) != 200:
-            raise RuntimeError(
-                f"Spreadsheet PDF export failed with status {response.status}"
-            )
-        return content
+
+        def export() -> bytes:
+            http = self.creds.authorize(httplib2.Http())
+            response, content = http.request(url, "GET")
+            if int(response.status) == 429:
+                raise RateLimited(
+                    "Spreadsheet PDF export rate limited", response.get("retry-after")
+                )
+            if int(response.status) != 200:
+                raise RuntimeError(
+                    f"Spreadsheet PDF export failed with status {response.status}"
+                )
+            return content
+
+        return self.quota.call("drive:read", export)
 
     def download_sheet(self, client) -> str:
         """Download the spreadsheet as Excel file"""
@@ -373,9 +433,6 @@ class Client:
             self.logger.info(
                 f"Downloading spreadsheet for lote {self.batch} and client {client}"
             )
-            # Get the spreadsheet as bytes
-            spreadsheet_data = self.spreadsheet.export(format=ExportFormat.EXCEL)
-
             # Create downloads directory if it doesn't exist
             download_dir = "downloads"
             if not os.path.exists(download_dir):
@@ -393,8 +450,12 @@ class Client:
             filename = f"{self.batch}-{formatted_client}.xlsx"
             filepath = os.path.join(download_dir + f"/{self.batch}", filename)
 
-            with open(filepath, "wb") as f:
-                f.write(spreadsheet_data)
+            self.exports.export(
+                self.spreadsheet.id,
+                "xlsx",
+                filepath,
+                lambda: self.spreadsheet.export(format=ExportFormat.EXCEL),
+            )
 
             self.logger.info(f"Spreadsheet saved to {filepath}")
             return filepath
@@ -411,19 +472,37 @@ class Client:
             if not os.path.exists(download_dir):
                 os.makedirs(download_dir)
 
-            # Connect to destination spreadsheet
-            dest_spreadsheet = self.sheets_api_client.open_by_key(
-                "12RXnw6ZBzgG4Yn0EvUZbgf2esJ-fFDdL-uEvcTpuS8w"  # Replace with your actual spreadsheet key
-            )
-
-            spreadsheet_data = dest_spreadsheet.export(format=ExportFormat.EXCEL)
+            consecutivos_key = CONSECUTIVOS_KEY
 
             # Save the file
             filename = f"Consecutivos.xlsx"
             filepath = os.path.join(download_dir, filename)
 
-            with open(filepath, "wb") as f:
-                f.write(spreadsheet_data)
+            if self.backend == "local":
+                # Opened through the writer, which creates it if needed
+                self.consecutivos_writer.worksheet.spreadsheet.save(filepath)
+                self.logger.info(f"Spreadsheet saved to {filepath}")
+                return filepath
+
+            # Other people edit Consecutivos too, so a recorded export is only
+            # reused while Drive reports no newer modification. There is
+            # nothing to compare after flush_consecutivos invalidated it: it
+            # is exported right away, without the metadata call, and its
+            # version is learnt on the next download
+            modified_time = None
+            if self.exports.exported(consecutivos_key, "xlsx"):
+                modified_time = self.sheets_api_client.get_file_drive_metadata(
+                    consecutivos_key
+                )["modifiedTime"]
+            self.exports.export(
+                consecutivos_key,
+                "xlsx",
+                filepath,
+                lambda: self.sheets_api_client.export(
+                    consecutivos_key, format=ExportFormat.EXCEL
+                ),
+                version=modified_time,
+            )
 
             self.logger.info(f"Spreadsheet saved to {filepath}")
             return filepath
@@ -432,43 +511,68 @@ class Client:
             self.logger.error(f"Error downloading spreadsheet: {str(e)}")
             raise
 
-    def copy_consecutivo_row(self, row_number: int):
+    def read_consecutivo_row(self, row_number: int) -> list:
         """
-        Copy a specific row from 'Consec' sheet and upload it to another Google Sheet
+        Read a row from the 'Consec' sheet and sanitize its values
 
         Args:
-            row_number: The row number to copy from the Consec sheet
+            row_number: The row number to read from the Consec sheet
+
+        Returns:
+            list: Sanitized values, empty if the row has no data
         """
         try:
-            # Get source worksheet
-            source_worksheet = self.spreadsheet.worksheet("Consec")
+            row_values = self.worksheets.get("Consec").row_values(row_number)
+        except gspread.exceptions.APIError as e:
+            if not is_structure_error(e):
+                raise
+            # The cached handle points to a tab that was renamed or deleted
+            self.worksheets.invalidate()
+            row_values = self.worksheets.get("Consec").row_values(row_number)
 
-            # Get the values from the specified row
-            row_values = source_worksheet.row_values(row_number)
+        if not any(row_values):  # Skip empty rows
+            self.logger.warning(f"Row {row_number} is empty, skipping")
+            return []
 
-            if not any(row_values):  # Skip empty rows
-                self.logger.warning(f"Row {row_number} is empty, skipping")
-                return
+        return sanitize_values(row_values)
 
-            # Connect to destination spreadsheet
-            dest_spreadsheet = self.sheets_api_client.open_by_key(
-                "12RXnw6ZBzgG4Yn0EvUZbgf2esJ-fFDdL-uEvcTpuS8w"
-            )
-            dest_worksheet = dest_spreadsheet.sheet1
+    def append_consecutivo_row(self, row_values: list):
+        """
+        Queue an already sanitized row for the Consecutivos spreadsheet.
+        It is written by the next flush_consecutivos of this client.
 
-            # Get current values to find last row
-            existing_values = dest_worksheet.get_all_values()
-            next_row = len(existing_values) + 1
+        Args:
+            row_values: Values to write after the last used row
+        """
+        self.consecutivos_pending.append(row_values)
 
-            # Sanitize values
-            row_values = [self.sanitize_value(value) for value in row_values]
+    def flush_consecutivos(self) -> int:
+        """
+        Append the queued Consecutivos rows in a single values:append.
+        They are dropped from the queue even if it fails.
 
-            # Append the row to the next available row
-            dest_worksheet.insert_row(
-                row_values, next_row, value_input_option="USER_ENTERED"
-            )
+        Returns:
+            int: Rows appended
+        """
+        rows, self.consecutivos_pending = self.consecutivos_pending, []
+        appended = self.consecutivos_writer.append(rows)
+        if appended:
+            # Drive's modifiedTime can lag behind the append
+            self.exports.invalidate(self.consecutivos_writer.key)
+        return appended
+
+    def copy_consecutivo_row(self, row_number: int):
+        """
+        Copy a specific row from 'Consec' sheet and upload it to another Google Sheet
 
-            self.logger.info(f"Appended row to position {next_row}: {row_values}")
+        Args:
+            row_number: The row number to copy from the Consec sheet
+        """
+        try:
+            row_values = self.read_consecutivo_row(row_number)
+            if row_values:
+                self.append_consecutivo_row(row_values)
+                self.flush_consecutivos()
 
         except gspread.exceptions.APIError as e:
             self.logger.error(f"Google Sheets API error: {str(e)}")
@@ -497,7 +601,6 @@ class Client:
                 ["lIQUIDACIONES", "LIQUIDACIONES", "lIQUIDACION", "LIQUIDACION"]
             )
             self.logger.info(f"Exporting PDF for worksheet: {worksheet.title}")
-            spreadsheet_data = self.export_worksheet_pdf(worksheet)
 
             # Create downloads directory if it doesn't exist
             download_dir = "downloads/" + self.batch
@@ -511,8 +614,12 @@ class Client:
             filename = f"{self.batch}_{formatted_client}_.pdf"
             filepath = os.path.join(download_dir, filename)
 
-            with open(filepath, "wb") as f:
-                f.write(spreadsheet_data)
+            self.exports.export(
+                self.spreadsheet.id,
+                f"pdf:{worksheet.id}",
+                filepath,
+                lambda: self.export_worksheet_pdf(worksheet),
+            )
 
             self.logger.info(f"PDF spreadsheet saved to {filepath}")
             return filepath
@@ -523,79 +630,8 @@ class Client:
             raise
 
     def sanitize_value(self, value: Union[str, int, float]) -> Union[str, float]:
-        """
-        Sanitize values before writing to spreadsheet.
-        Handles:
-        - Numbers (e.g., "15025", "1252")
-        - Decimal numbers (e.g., "2119,9", "124,7")
-        - Currency values (e.g., "$ 17.361.271")
-        - Percentages (e.g., "82,7%")
-        - Times (e.g., "1:01:15")
-        - Dates (e.g., "2025-07-22 09:49:08")
-        """
-        try:
-            if value is None:
-                return ""
-
-            if isinstance(value, (int, float)):
-                return value
-
-            # Convert to string and clean whitespace and leading apostrophes
-            value = str(value).strip().lstrip("'")
-
-            # Handle empty strings
-            if not value:
-                return ""
-
-            # Handle date-time format (contains both date and time)
-            if len(value.split("-")) == 3 and " " in value:
-                return value
-
-            # Handle time format (HH:MM:SS)
-            if value.count(":") == 2:
-                return value
-
-            # Handle currency values with $ symbol
-            if value.startswith("$"):
-                cleaned = (
-                    value.replace("$", "").replace(".", "").replace(",", "").strip()
-                )
-                try:
-                    return float(cleaned)
-                except ValueError:
-                    return value
-
-            # Handle percentage values
-            if value.endswith("%"):
-                cleaned = value.rstrip("%").replace(",", ".")
-                try:
-                    return float(cleaned) / 100
-                except ValueError:
-                    return value
-
-            # Handle decimal numbers with comma
-            if "," in value:
-                cleaned = value.replace(",", ".")
-                try:
-                    return float(cleaned)
-                except ValueError:
-                    return value
-
-            # Handle regular numbers
-            try:
-                # Remove any thousand separators and try to convert
-                cleaned = value.replace(".", "")
-                if cleaned.isdigit():
-                    return float(cleaned)
-            except ValueError:
-                pass
-
-            # If all else fails, return the original value
-            return value
-
-        except Exception as e:
-            self.logger.error(f"Error sanitizing value '{value}': {str(e)}")
-            return value
+        """Sanitize a value before writing to spreadsheet, see services.sanitize"""
+        return sanitize_value(value)
 
     def _normalize_text(self, text: str) -> str:
         """
@@ -716,8 +752,16 @@ class Client:
 
         try:
             # Cargar workbook desde bytes
-            workbook = load_workbook(BytesIO(excel_bytes), data_only=True)
+            from openpyxl import load_workbook
 
+            # Solo lectura: las filas se leen una vez, en orden, sin armar
+            # el modelo de celdas y estilos completo
+            workbook = load_workbook(BytesIO(excel_bytes), read_only=True, data_only=True)
+        except Exception as e:
+            self.logger.error(f"Error parsing decomisos Excel: {str(e)}")
+            return result
+
+        try:
             self.logger.info(f"Excel sheets found: {workbook.sheetnames}")
 
             # Parsear hoja "Cantidades decomisadas"
@@ -730,6 +774,8 @@ class Client:
             if cantidades_sheet_name:
                 self.logger.info(f"Parsing sheet: {cantidades_sheet_name}")
                 sheet = workbook[cantidades_sheet_name]
+                # La dimensión declarada puede no cubrir todas las columnas
+                sheet.reset_dimensions()
                 result["cantidades"] = self._parse_cantidades_sheet(sheet)
             else:
                 self.logger.warning("Sheet 'Cantidades decomisadas' not found")
@@ -744,6 +790,7 @@ class Client:
             if motivos_sheet_name:
                 self.logger.info(f"Parsing sheet: {motivos_sheet_name}")
                 sheet = workbook[motivos_sheet_name]
+                sheet.reset_dimensions()
                 result["motivos"] = self._parse_motivos_sheet(sheet)
             else:
                 self.logger.warning("Sheet 'Motivos de decomisos' not found")
@@ -752,6 +799,8 @@ class Client:
 
         except Exception as e:
             self.logger.error(f"Error parsing decomisos Excel: {str(e)}")
+        finally:
+            workbook.close()
 
         return result
 
@@ -767,74 +816,53 @@ class Client:
             decomisos_data: dict con "cantidades" y "motivos"
         """
         try:
-            # Acceder a la hoja "Decomisos" existente
-            worksheet = self.spreadsheet.worksheet("Decomisos")
-            self.logger.info("Accessed 'Decomisos' worksheet")
+            writes = WriteBuffer(self.spreadsheet, self.exports, self.worksheets)
 
             # Limpiar contenido existente
-            worksheet.clear()
-            self.logger.info("Cleared existing content in Decomisos sheet")
+            writes.clear_sheet("Decomisos")
 
-            batch_updates = []
             current_row = 1
 
             # ===== Tabla 1: Cantidades Decomisadas =====
             header_cantidades = [
                 "Individuo", "Órgano", "Cantidad", "Unidad", "Fecha Registro", "Sección"
             ]
-            batch_updates.append({
-                "range": f"A{current_row}:F{current_row}",
-                "values": [header_cantidades]
-            })
-            current_row += 1
+            rows = [header_cantidades]
 
             # Datos de cantidades
             for item in decomisos_data.get("cantidades", []):
-                row_values = [
+                rows.append([
                     item.get("individuo", ""),
                     item.get("organo", ""),
                     item.get("cantidad", 0),
                     item.get("unidad", ""),
                     item.get("fecha_registro", ""),
                     item.get("seccion", "")
-                ]
-                batch_updates.append({
-                    "range": f"A{current_row}:F{current_row}",
-                    "values": [row_values]
-                })
-                current_row += 1
+                ])
+            writes.write("Decomisos", f"A{current_row}", rows)
 
             # Espacio entre tablas (2 filas vacías)
-            current_row += 2
+            current_row += len(rows) + 2
 
             # ===== Tabla 2: Motivos de Decomisos =====
             header_motivos = [
                 "Individuo", "Órgano", "Patología", "Decomiso Total", "Fecha Registro"
             ]
-            batch_updates.append({
-                "range": f"A{current_row}:E{current_row}",
-                "values": [header_motivos]
-            })
-            current_row += 1
+            rows = [header_motivos]
 
             # Datos de motivos
             for item in decomisos_data.get("motivos", []):
-                row_values = [
+                rows.append([
                     item.get("individuo", ""),
                     item.get("organo", ""),
                     item.get("patologia", ""),
                     "Sí" if item.get("decomiso_total") else "No",
                     item.get("fecha_registro", "")
-                ]
-                batch_updates.append({
-                    "range": f"A{current_row}:E{current_row}",
-                    "values": [row_values]
-                })
-                current_row += 1
+                ])
+            writes.write("Decomisos", f"A{current_row}", rows)
 
-            # Ejecutar batch update
-            if batch_updates:
-                worksheet.batch_update(batch_updates)
+            # Un batchClear y un batchUpdate para toda la hoja
+            writes.flush()
 
             cantidades_count = len(decomisos_data.get("cantidades", []))
             motivos_count = len(decomisos_data.get("motivos", []))
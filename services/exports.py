@@ -0,0 +1,121 @@
+"""
+Bookkeeping of spreadsheet exports.
+
+Exporting a spreadsheet (xlsx of the whole workbook, pdf of one worksheet)
+is the slowest Drive call of a lote. ExportManager remembers, for every
+spreadsheet and export kind, which revision of the spreadsheet was exported
+and to which file. Writes mark the sheets they touch as changed; an export
+requested while nothing changed since the previous one is served from the
+file already on disk instead of being downloaded again.
+
+Changes are tracked per sheet, but any change invalidates every export of
+the spreadsheet: LIQUIDACION and Consec are formulas over INFO and despacho,
+so a sheet that was not written can still render differently.
+"""
+import os
+import shutil
+import threading
+from logger_config import setup_logger
+from services import metrics
+
+logger = setup_logger()
+
+
+class ExportManager:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # spreadsheet id -> revision, bumped on every write
+        self._revisions = {}
+        # spreadsheet id -> sheets written since its last export
+        self._changed_sheets = {}
+        # (spreadsheet id, kind) -> {"version", "path"}
+        self._exports = {}
+        self.performed = 0
+        self.saved = 0
+
+    def mark_dirty(self, spreadsheet_id: str, sheets=()):
+        """Record that sheets of a spreadsheet were written"""
+        with self._lock:
+            self._revisions[spreadsheet_id] = self._revisions.get(spreadsheet_id, 0) + 1
+            self._changed_sheets.setdefault(spreadsheet_id, set()).update(sheets)
+
+    def changed_sheets(self, spreadsheet_id: str) -> set:
+        with self._lock:
+            return set(self._changed_sheets.get(spreadsheet_id, ()))
+
+    def exported(self, spreadsheet_id: str, kind: str) -> bool:
+        """
+        Whether an export of this kind is recorded and still on disk, i.e.
+        whether export() could reuse it. False after invalidate().
+        """
+        with self._lock:
+            previous = self._exports.get((spreadsheet_id, kind))
+        return bool(previous) and os.path.exists(previous["path"])
+
+    def export(self, spreadsheet_id: str, kind: str, path: str, fetch, version=None) -> str:
+        """
+        Write an export of a spreadsheet to path unless an identical one exists.
+
+        Args:
+            spreadsheet_id: Spreadsheet being exported
+            kind: Identifies the export, e.g. "xlsx" or "pdf:<gid>"
+            path: Destination file
+            fetch: Callable returning the exported bytes
+            version: Revision of the spreadsheet when it is not written through
+                this process (e.g. the Drive modifiedTime). Defaults to the
+                revision tracked by mark_dirty.
+
+        Returns:
+            str: path
+        """
+        key = (spreadsheet_id, kind)
+        with self._lock:
+            if version is None:
+                version = self._revisions.get(spreadsheet_id, 0)
+            previous = self._exports.get(key)
+
+        if (
+            previous
+            and previous["version"] == version
+            and os.path.exists(previous["path"])
+        ):
+            with metrics.timed(f"export:{kind.split(':')[0]}:reused"):
+                if previous["path"] != path:
+                    shutil.copyfile(previous["path"], path)
+            with self._lock:
+                self.saved += 1
+            logger.info(f"Reused unchanged {kind} export of {spreadsheet_id} for {path}")
+            return path
+
+        # "export:xlsx", "export:pdf", timed with the file write
+        with metrics.timed(f"export:{kind.split(':')[0]}"):
+            content = fetch()
+            with open(path, "wb") as f:
+                f.write(content)
+        with self._lock:
+            self.performed += 1
+            self._exports[key] = {"version": version, "path": path}
+            self._changed_sheets.pop(spreadsheet_id, None)
+        return path
+
+    def invalidate(self, spreadsheet_id: str):
+        """
+        Make the next exports of a spreadsheet download it again, whatever
+        version they are given. For writes the version doesn't show yet,
+        like an append before Drive updates modifiedTime.
+        """
+        with self._lock:
+            for key in [key for key in self._exports if key[0] == spreadsheet_id]:
+                del self._exports[key]
+
+    def forget(self, spreadsheet_id: str):
+        """Drop everything known about a deleted spreadsheet"""
+        with self._lock:
+            self._revisions.pop(spreadsheet_id, None)
+            self._changed_sheets.pop(spreadsheet_id, None)
+            for key in [key for key in self._exports if key[0] == spreadsheet_id]:
+                del self._exports[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"performed": self.performed, "saved": self.saved}
@@ -0,0 +1,158 @@
+"""
+Background jobs for long running lote processing.
+
+A job runs on a thread pool owned by the JobManager and reports its progress
+as a list of steps, so the web request that submits it can return right away
+and the browser polls the job state instead of holding a worker. The stage
+timings and API counters recorded while it runs (services.metrics) are kept
+as its timing summary.
+
+Jobs run in the process that queued them. Every change of state is also
+written to a store shared with the other app processes (the lote store,
+services.lote_store), so a poll that reaches another gunicorn worker still
+finds the job.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from logger_config import setup_logger
+from services import metrics
+
+logger = setup_logger()
+
+
+class Job:
+    def __init__(self, job_id: str, description: str, on_change=None):
+        """
+        Args:
+            on_change: Called with the job after every change of state
+        """
+        self.id = job_id
+        self.description = description
+        self.status = "queued"
+        self.steps = []
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.metrics = metrics.JobMetrics()
+        self.on_change = on_change
+        self._lock = threading.Lock()
+
+    def progress(self, message: str):
+        """Record a finished step. Safe to call from several threads."""
+        with self._lock:
+            self.steps.append({"time": time.time(), "message": message})
+        logger.info(f"[job {self.id}] {message}")
+        self.changed()
+
+    def changed(self):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(self)
+        except Exception as e:
+            # The job goes on; only other processes' polls miss the update
+            logger.error(f"Could not store the state of job {self.id}: {str(e)}")
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "description": self.description,
+                "status": self.status,
+                "steps": list(self.steps),
+                "error": self.error,
+                "result": self.result,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "timings": self.metrics.summary(),
+            }
+
+
+class JobManager:
+    def __init__(self, max_workers: int = 2, max_age: int = 3600, store=None):
+        """
+        Args:
+            max_workers: Jobs running at the same time, the rest wait queued
+            max_age: Seconds a finished job is kept for polling
+            store: LoteStore or SQLiteLoteStore the job states are written to,
+                for the polls other processes answer. Without one only this
+                process knows its jobs.
+        """
+        self.max_age = max_age
+        self.store = store
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job"
+        )
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, description: str, fn, *args, **kwargs) -> Job:
+        """
+        Queue fn(*args, progress=job.progress, **kwargs) and return its Job.
+        Whatever fn returns is stored as the job result.
+        """
+        job = Job(uuid.uuid4().hex, description, self._save if self.store else None)
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        job.changed()
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        logger.info(f"Queued job {job.id}: {description}")
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """Job queued by this process, None if unknown here"""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def state(self, job_id: str) -> dict:
+        """
+        Returns:
+            dict: Job.to_dict() of the job, whichever process queued it
+            None: Unknown or expired job
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is None:
+            return None
+        return self.store.get(_store_key(job_id))
+
+    def _save(self, job: Job):
+        self.store.set(_store_key(job.id), job.to_dict())
+
+    def _run(self, job: Job, fn, args, kwargs):
+        job.status = "running"
+        job.metrics = metrics.JobMetrics()
+        job.changed()
+        try:
+            with metrics.collect(job.metrics):
+                job.result = fn(*args, progress=job.progress, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.changed()
+            logger.info(
+                f"Job {job.id} timings: {metrics.describe(job.metrics.summary())}"
+            )
+
+    def _prune(self):
+        limit = time.time() - self.max_age
+        for job_id in [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.finished_at and job.finished_at < limit
+        ]:
+            del self.jobs[job_id]
+
+
+def _store_key(job_id: str) -> str:
+    # Apart from the lote contexts, which are keyed by bare hex ids
+    return f"job:{job_id}"
@@ -0,0 +1,198 @@
+"""
+Local stand-in for the gspread Spreadsheet/Worksheet API backed by openpyxl.
+
+services.excel.Client fills the template through a handful of gspread calls
+(worksheet, values_batch_update, values_batch_clear, row_values, export). These
+classes implement that same subset on top of a copy of base.xlsx, so the fill
+methods run unchanged without any HTTP round-trip and the result is saved
+straight to disk.
+
+Formulas are kept as written and recalculated when the file is opened in
+Excel; they are not evaluated here.
+
+LocalSpreadsheet.open_file keeps a spreadsheet in a file instead, saved after
+every append: the local backend's Consecutivos.
+"""
+import os
+import threading
+import uuid
+from io import BytesIO
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import ExportFormat
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils.cell import range_boundaries
+
+
+class LocalWorksheet:
+    def __init__(self, spreadsheet, sheet):
+        self.spreadsheet = spreadsheet
+        self.sheet = sheet
+
+    @property
+    def title(self) -> str:
+        return self.sheet.title
+
+    @property
+    def id(self) -> int:
+        return self.spreadsheet.workbook.worksheets.index(self.sheet)
+
+    def _boundaries(self, a1_range: str):
+        min_col, min_row, max_col, max_row = range_boundaries(a1_range)
+        return (
+            min_col or 1,
+            min_row or 1,
+            max_col or self.sheet.max_column,
+            max_row or self.sheet.max_row,
+        )
+
+    def batch_update(self, data: list):
+        """Write [{"range": "A1:C1", "values": [[...]]}, ...] as RAW values"""
+        for update in data:
+            min_col, min_row, _, _ = self._boundaries(update["range"])
+            for row_offset, row in enumerate(update["values"]):
+                for col_offset, value in enumerate(row):
+                    self.sheet.cell(
+                        row=min_row + row_offset,
+                        column=min_col + col_offset,
+                        value=value,
+                    )
+
+    def batch_clear(self, ranges: list):
+        for a1_range in ranges:
+            min_col, min_row, max_col, max_row = self._boundaries(a1_range)
+            for row in self.sheet.iter_rows(
+                min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col
+            ):
+                for cell in row:
+                    cell.value = None
+
+    def clear(self):
+        for row in self.sheet.iter_rows():
+            for cell in row:
+                cell.value = None
+
+    def append_rows(self, values: list, value_input_option=None, insert_data_option=None):
+        """Write rows after the last used row, and save the file if there is one"""
+        with self.spreadsheet._lock:
+            for row in values:
+                self.sheet.append(row)
+            self.spreadsheet.save()
+        return {"updates": {"updatedRows": len(values)}}
+
+    def row_values(self, row: int) -> list:
+        """
+        Values of a row without trailing empty cells.
+
+        Formula cells come back empty: there is no calculation engine here and
+        returning the formula text would copy it to other spreadsheets.
+        """
+        values = []
+        for cell in self.sheet[row]:
+            value = cell.value
+            if value is None or (isinstance(value, str) and value.startswith("=")):
+                value = ""
+            values.append(value)
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+
+class LocalSpreadsheet:
+    def __init__(self, path_or_file, title: str = None):
+        self.workbook = load_workbook(path_or_file)
+        self.title = title or "base"
+        self.id = uuid.uuid4().hex
+        # Set by open_file, where save() writes the workbook
+        self.path = None
+        # Taken again by save() while appending
+        self._lock = threading.RLock()
+
+    @classmethod
+    def open_file(cls, path: str, title: str = None):
+        """
+        Spreadsheet kept in the xlsx at path, created with one empty tab
+        named title if it doesn't exist yet.
+        """
+        if not os.path.exists(path):
+            workbook = Workbook()
+            workbook.active.title = title or "Sheet1"
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            workbook.save(path)
+        spreadsheet = cls(path, title)
+        spreadsheet.path = path
+        return spreadsheet
+
+    def save(self, path: str = None):
+        """Write the workbook to path, or to its own file if it has one"""
+        path = path or self.path
+        if path:
+            with self._lock:
+                self.workbook.save(path)
+
+    def worksheets(self) -> list:
+        return [LocalWorksheet(self, sheet) for sheet in self.workbook.worksheets]
+
+    def worksheet(self, title: str) -> LocalWorksheet:
+        if title not in self.workbook.sheetnames:
+            raise WorksheetNotFound(title)
+        return LocalWorksheet(self, self.workbook[title])
+
+    @property
+    def sheet1(self) -> LocalWorksheet:
+        return LocalWorksheet(self, self.workbook.worksheets[0])
+
+    def _split_range(self, range_name: str):
+        """("title", "A1:B2") of "'title'!A1:B2", "A1:B2" is None for a whole sheet"""
+        title, _, a1_range = range_name.rpartition("!")
+        if not title:
+            title, a1_range = a1_range, None
+        if title.startswith("'") and title.endswith("'"):
+            title = title[1:-1].replace("''", "'")
+        return self.worksheet(title), a1_range
+
+    def values_batch_update(self, body: dict):
+        """
+        Same body as the values:batchUpdate endpoint. None leaves a cell as it
+        is and "" clears it, like the Sheets API does.
+        """
+        for update in body["data"]:
+            worksheet, a1_range = self._split_range(update["range"])
+            min_col, min_row, _, _ = worksheet._boundaries(a1_range or "A1")
+            for row_offset, row in enumerate(update["values"]):
+                for col_offset, value in enumerate(row):
+                    if value is None:
+                        continue
+                    # cell(value=None) would keep the old value
+                    worksheet.sheet.cell(
+                        row=min_row + row_offset, column=min_col + col_offset
+                    ).value = None if value == "" else value
+
+    def values_batch_clear(self, params: dict = None, body: dict = None):
+        for range_name in (body or {}).get("ranges", []):
+            worksheet, a1_range = self._split_range(range_name)
+            if a1_range:
+                worksheet.batch_clear([a1_range])
+            else:
+                worksheet.clear()
+
+    def add_worksheet(self, title: str, rows: int = 100, cols: int = 26):
+        return LocalWorksheet(self, self.workbook.create_sheet(title))
+
+    def export(self, format=ExportFormat.EXCEL) -> bytes:
+        if format != ExportFormat.EXCEL:
+            raise ValueError(f"Local spreadsheets only export to Excel, not {format}")
+        buffer = BytesIO()
+        self.workbook.save(buffer)
+        return buffer.getvalue()
+
+    def export_worksheet_pdf(self, worksheet: LocalWorksheet) -> bytes:
+        # reportlab is only needed by the local backend, imported on first use
+        from utils import excel_to_pdf
+
+        pdf = BytesIO()
+        excel_to_pdf(BytesIO(self.export()), pdf, sheet_names=[worksheet.title])
+        return pdf.getvalue()
+
+    def copy(self, title: str = None):
+        """Independent in-memory copy, the local equivalent of a Drive copy"""
+        return LocalSpreadsheet(BytesIO(self.export()), title=title)
@@ -0,0 +1,133 @@
+"""
+Lookup indexes of the lote being filled.
+
+fill_despacho and fill_liquidacion look up, for every individual or client,
+the dispatch of its destination and the load dates of the vehicle that took
+it. LoteContext builds those maps once from the lote body in fill_info.
+
+The despacho rows of every client are built in a single pass over the
+individuals, partitioned by destination label. fill_despacho only writes
+the block of its client, so a client costs time in proportion to its own
+animals instead of the whole lote.
+"""
+import threading
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+
+def normalize_client(name: str) -> str:
+    """Client name as compared against dispatch destinations"""
+    return name.strip().upper()
+
+
+class LoteContext:
+    def __init__(self, body: dict, individuals: list = None):
+        """
+        Args:
+            body: Lote body returned by INFOCGAN
+            individuals: Individuals body of the lote, partitioned right
+                away if given, otherwise on the first despacho_rows call
+        """
+        self.batch = body["batch"]
+        # plate -> (start_date, end_date); the first vehicle of a plate wins
+        self.load_dates_by_plate = {}
+        # iddestination -> {"name", "plate", "code"}
+        self.dispatch_by_destination = {}
+        # normalized destination name -> dispatch; the first one wins
+        self.dispatch_by_client = {}
+        self._lock = threading.Lock()
+        self._individuals = None
+        self._rows_by_client = {}
+
+        for dispatch in body["dispatched"]:
+            for vehicle_dispatch in dispatch["vehiclesdispatch"]:
+                self.load_dates_by_plate.setdefault(
+                    vehicle_dispatch["plate"],
+                    (vehicle_dispatch["startdate"], vehicle_dispatch["enddate"]),
+                )
+            self.dispatch_by_destination[dispatch["iddestination"]] = {
+                "name": dispatch["namedestination"],
+                "plate": dispatch["dispatchvehicle"]["plate"],
+                "code": dispatch["dispatch"]["code"],
+            }
+        for details in self.dispatch_by_destination.values():
+            self.dispatch_by_client.setdefault(normalize_client(details["name"]), details)
+
+        if individuals is not None:
+            self._partition(individuals)
+
+    def _despacho_row(self, individual: dict, batch: str) -> list:
+        """Columns A:R of the despacho sheet for an individual"""
+        dest_value = individual["destination"]["value"]
+        if not dest_value:
+            plate = code = 0
+            load_dates = (0, 0)
+        else:
+            dispatch_info = self.dispatch_by_destination.get(dest_value)
+            if dispatch_info:
+                plate = dispatch_info["plate"]
+                code = dispatch_info["code"]
+                load_dates = self.load_dates(plate)
+            else:
+                logger.error(f"No dispatch found for destination {dest_value}")
+                plate = code = None
+                load_dates = ("?", "?")
+
+        return [
+            load_dates[0],  # A
+            load_dates[1],  # B
+            f"{batch}-{individual['consecutive']}",  # C
+            "",  # D (empty)
+            individual["property"]["label"],  # E
+            individual["ppe"],  # F
+            individual["pcc"],  # G
+            "",  # H (empty)
+            individual["pcr"],  # I
+            individual["gd"],  # J
+            individual["ml"],  # K
+            individual["seurop"],  # L
+            individual["mc"],  # M
+            individual["mckg"],  # N
+            individual["indexpse"],  # O
+            individual["destination"]["label"] if dest_value else 0,  # P
+            plate,  # Q
+            code,  # R
+        ]
+
+    def _partition(self, individuals: list):
+        batch = individuals[0]["batch"].split("-")[1] if individuals else ""
+        rows_by_client = {}
+        for individual in individuals:
+            rows_by_client.setdefault(individual["destination"]["label"], []).append(
+                self._despacho_row(individual, batch)
+            )
+        self._individuals = individuals
+        self._rows_by_client = rows_by_client
+        counts = {client: len(rows) for client, rows in rows_by_client.items()}
+        logger.info(f"Despacho rows of lote {self.batch}: {counts}")
+
+    def despacho_rows(self, individuals: list, client: str) -> list:
+        """
+        Despacho rows of the individuals whose destination label is client,
+        in the order of the body.
+
+        The partition is kept for the body it was built from; working copies
+        share the context, so the clients of a lote build it only once.
+        """
+        with self._lock:
+            if self._individuals is not individuals:
+                self._partition(individuals)
+            return self._rows_by_client.get(client, [])
+
+    def load_dates(self, plate) -> tuple:
+        """(start_date, end_date) of the vehicle with this plate"""
+        dates = self.load_dates_by_plate.get(plate)
+        if dates is None:
+            logger.error(f"Could not find vehicle for plate {plate}")
+            return ("?", "?")
+        return dates
+
+    def client_dispatch(self, client: str) -> dict:
+        """Dispatch of the destination named client, None if there is none"""
+        return self.dispatch_by_client.get(normalize_client(client))
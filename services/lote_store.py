@@ -0,0 +1,173 @@
+"""
+Lotes selected by operators, kept between requests.
+
+The form fetches a lote and the later requests (/loading, /process,
+/complete, /download) act on it. Each selection is stored as a context under
+a random key that goes into the operator's Flask session, so two operators,
+or two browser sessions of the same one, never see each other's lote.
+Contexts not used for ttl seconds are dropped.
+
+LoteStore keeps them in memory, which only works with a single app process.
+SQLiteLoteStore keeps them in a SQLite file that every gunicorn worker on
+the machine opens, so any worker can serve the next request of a session.
+The state of background jobs (services.jobs) is kept there too, under keys
+of its own, so any worker can answer their polls.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+
+class LoteStore:
+    def __init__(self, ttl: int = 3600):
+        """
+        Args:
+            ttl: Seconds a context is kept after it was last read or written
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (expires_at, context)
+        self._contexts = {}
+
+    def _evict(self, now: float):
+        for key in [key for key, (expires_at, _) in self._contexts.items() if expires_at < now]:
+            del self._contexts[key]
+
+    def put(self, context: dict) -> str:
+        """Store a context and return its new key"""
+        key = uuid.uuid4().hex
+        self.set(key, context)
+        return key
+
+    def set(self, key: str, context: dict):
+        """Store a context under key, replacing the one there"""
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            self._contexts[key] = (now + self.ttl, context)
+
+    def get(self, key: str) -> dict:
+        """
+        Returns:
+            dict: The context, its TTL restarted
+            None: Unknown or expired key
+        """
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._contexts.get(key)
+            if entry is None or entry[0] < now:
+                self._contexts.pop(key, None)
+                return None
+            self._contexts[key] = (now + self.ttl, entry[1])
+            return entry[1]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._contexts.pop(key, None)
+
+
+class SQLiteLoteStore:
+    def __init__(self, path: str = "cache/lotes.sqlite3", ttl: int = 3600):
+        """
+        Args:
+            path: SQLite file shared by the app processes
+            ttl: Seconds a context is kept after it was last read or written
+        """
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS lotes "
+                "(key TEXT PRIMARY KEY, context TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # One connection per call: sqlite3 connections can't be shared
+        # between the request threads
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def put(self, context: dict) -> str:
+        """Store a context and return its new key"""
+        key = uuid.uuid4().hex
+        self.set(key, context)
+        return key
+
+    def set(self, key: str, context: dict):
+        """Store a context under key, replacing the one there"""
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM lotes WHERE expires_at < ?", (now,))
+                connection.execute(
+                    "INSERT OR REPLACE INTO lotes (key, context, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, json.dumps(context), now + self.ttl),
+                )
+        finally:
+            connection.close()
+
+    def get(self, key: str) -> dict:
+        """
+        Returns:
+            dict: The context, its TTL restarted
+            None: Unknown or expired key
+        """
+        if not key:
+            return None
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                row = connection.execute(
+                    "SELECT context FROM lotes WHERE key = ? AND expires_at >= ?",
+                    (key, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                connection.execute(
+                    "UPDATE lotes SET expires_at = ? WHERE key = ?", (now + self.ttl, key)
+                )
+        finally:
+            connection.close()
+        try:
+            return json.loads(row[0])
+        except ValueError as e:
+            logger.error(f"Discarding unreadable lote context {key}: {e}")
+            self.delete(key)
+            return None
+
+    def delete(self, key: str):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM lotes WHERE key = ?", (key,))
+        finally:
+            connection.close()
+
+
+def create_lote_store(backend: str = "memory", path: str = None, ttl: int = 3600):
+    """
+    Args:
+        backend: "memory" (single process) or "sqlite" (shared by workers)
+        path: SQLite file of the "sqlite" backend
+        ttl: Seconds a context is kept after it was last used
+    """
+    if backend == "sqlite":
+        return SQLiteLoteStore(path or "cache/lotes.sqlite3", ttl)
+    if backend != "memory":
+        raise ValueError(f"Unknown lote store backend: {backend}")
+    return LoteStore(ttl)
@@ -0,0 +1,194 @@
+"""
+Stage timings and API counters of lote processing.
+
+Every INFOCGAN request, Google Sheets/Drive call, export and zip is timed
+under a stage name ("infocgan:batch", "sheets:write", "export:xlsx", "zip",
+...) and counted per API with the bytes it returned and the retries it
+needed. The counts go to two places:
+
+- the process-wide registry `metrics`, rendered in the Prometheus text
+  format by the /metrics route;
+- the JobMetrics of the lote being processed, if any. collect() makes one
+  current for the calling thread; submit() carries it to the threads of a
+  ThreadPoolExecutor, so the calls of parallel clients are counted for
+  their lote. Its summary() is stored with the job result.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "comcer"
+
+API_COUNTERS = ("calls", "bytes", "retries", "errors")
+
+_current = contextvars.ContextVar("job_metrics", default=None)
+
+
+def _add_stage(stages: dict, stage: str, seconds: float):
+    entry = stages.get(stage)
+    if entry is None:
+        stages[stage] = [1, seconds]
+    else:
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def _add_api(apis: dict, api: str, counts: dict):
+    entry = apis.setdefault(api, dict.fromkeys(API_COUNTERS, 0))
+    for name, value in counts.items():
+        entry[name] += value
+
+
+class JobMetrics:
+    """Stage timings and API counters of a single lote"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        # stage -> [count, seconds]
+        self._stages = {}
+        # api -> {"calls", "bytes", "retries", "errors"}
+        self._apis = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            _add_stage(self._stages, stage, seconds)
+
+    def count(self, api: str, **counts):
+        with self._lock:
+            _add_api(self._apis, api, counts)
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: {"seconds": wall time, "stages": {stage: {"count", "seconds"}},
+                "apis": {api: {"calls", "bytes", "retries", "errors"}}}
+        """
+        with self._lock:
+            return {
+                "seconds": round(time.monotonic() - self.started, 3),
+                "stages": {
+                    stage: {"count": count, "seconds": round(seconds, 3)}
+                    for stage, (count, seconds) in sorted(self._stages.items())
+                },
+                "apis": {api: dict(counts) for api, counts in sorted(self._apis.items())},
+            }
+
+
+class Metrics:
+    """Totals of the process since it started, for /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._apis = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            _add_stage(self._stages, stage, seconds)
+
+    def count(self, api: str, **counts):
+        with self._lock:
+            _add_api(self._apis, api, counts)
+
+    def render(self) -> str:
+        """Prometheus text exposition of the stage timings and API counters"""
+        with self._lock:
+            stages = {stage: list(entry) for stage, entry in self._stages.items()}
+            apis = {api: dict(counts) for api, counts in self._apis.items()}
+
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Time spent per processing stage",
+            f"# TYPE {PREFIX}_stage_seconds summary",
+        ]
+        for stage, (count, seconds) in sorted(stages.items()):
+            labels = f'{{stage="{_escape(stage)}"}}'
+            lines.append(f"{PREFIX}_stage_seconds_count{labels} {count}")
+            lines.append(f"{PREFIX}_stage_seconds_sum{labels} {seconds:.6f}")
+        for name in API_COUNTERS:
+            metric = f"{PREFIX}_api_{name}_total"
+            lines.append(f"# HELP {metric} {name.capitalize()} of INFOCGAN, Google and zip calls")
+            lines.append(f"# TYPE {metric} counter")
+            for api, counts in sorted(apis.items()):
+                lines.append(f'{metric}{{api="{_escape(api)}"}} {counts[name]}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_gauge(name: str, help_text: str, label: str, values: dict) -> str:
+    """Prometheus text of a gauge with one sample per label value"""
+    metric = f"{PREFIX}_{name}"
+    lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+    for key, value in sorted(values.items()):
+        lines.append(f'{metric}{{{label}="{_escape(key)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def describe(summary: dict, stages: int = 8) -> str:
+    """One line of a JobMetrics summary: wall time, slowest stages, API calls"""
+    slowest = sorted(
+        summary["stages"].items(), key=lambda item: item[1]["seconds"], reverse=True
+    )[:stages]
+    parts = [f"{summary['seconds']:.1f} s"]
+    parts += [
+        f"{stage} {entry['seconds']:.1f} s/{entry['count']}" for stage, entry in slowest
+    ]
+    parts += [
+        f"{api} {counts['calls']} calls/{counts['bytes']} B/{counts['retries']} retries"
+        for api, counts in summary["apis"].items()
+    ]
+    return ", ".join(parts)
+
+
+metrics = Metrics()
+
+
+def current() -> JobMetrics:
+    """JobMetrics of the lote being processed by this thread, None outside one"""
+    return _current.get()
+
+
+def observe(stage: str, seconds: float):
+    metrics.observe(stage, seconds)
+    job = _current.get()
+    if job is not None:
+        job.observe(stage, seconds)
+
+
+def count(api: str, calls: int = 1, size: int = 0, retries: int = 0, errors: int = 0):
+    """Count calls to an API, with the bytes (size) they returned and their retries"""
+    counts = {"calls": calls, "bytes": size, "retries": retries, "errors": errors}
+    metrics.count(api, **counts)
+    job = _current.get()
+    if job is not None:
+        job.count(api, **counts)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time the block under stage, whether it raises or not"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def collect(job: JobMetrics = None):
+    """Make job (a new JobMetrics by default) current for the block"""
+    job = job if job is not None else JobMetrics()
+    token = _current.set(job)
+    try:
+        yield job
+    finally:
+        _current.reset(token)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that keeps the current JobMetrics in the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
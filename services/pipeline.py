@@ -0,0 +1,198 @@
+"""
+Per-client processing of a lote.
+
+Every client of a lote produces its own Excel, liquidación PDF and Consecutivos
+row. Each lote is filled on its own copy of the template. In sequential mode
+the clients take turns on that copy; in parallel mode every client gets a
+private copy of it (already holding the lote INFO and Decomisos data) so several
+clients are filled and exported at the same time.
+
+Every step is timed in services.metrics ("lote:fill_info",
+"client:fill_despacho", ...), for the app totals and the JobMetrics of the
+lote.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from logger_config import setup_logger
+from services import metrics
+
+logger = setup_logger()
+
+# Row of the 'Consec' sheet that summarizes the liquidación of a client
+CONSECUTIVO_ROW = 6
+
+
+def _no_progress(message: str):
+    pass
+
+
+def process_client(
+    api_client, client, results_lote, results_individuals, progress=_no_progress
+) -> list:
+    """
+    Fill and export the documents of a single client.
+
+    Returns:
+        list: Sanitized Consecutivos row for the client (empty if none)
+    """
+    with metrics.timed("client:fill_despacho"):
+        api_client.fill_despacho(results_individuals, client)
+    progress(f"Despacho diligenciado: {client}")
+    with metrics.timed("client:fill_liquidacion"):
+        api_client.fill_liquidacion(results_lote, client)
+    progress(f"Liquidación diligenciada: {client}")
+    with metrics.timed("client:download_sheet"):
+        api_client.download_sheet(client)
+    progress(f"Excel exportado: {client}")
+    with metrics.timed("client:download_sheet_pdf"):
+        api_client.download_sheet_pdf(client)
+    progress(f"PDF exportado: {client}")
+    with metrics.timed("client:read_consecutivo_row"):
+        return api_client.read_consecutivo_row(CONSECUTIVO_ROW)
+
+
+def _process_client_copy(api_client, client, results_lote, results_individuals, progress):
+    with metrics.timed("client:working_copy"):
+        worker = api_client.working_copy(f"{api_client.batch}-{client}")
+    try:
+        return process_client(
+            worker, client, results_lote, results_individuals, progress
+        )
+    finally:
+        worker.discard_working_copy()
+
+
+def _flush_consecutivos(api_client, progress):
+    # One values:append for every row of the lote
+    with metrics.timed("lote:flush_consecutivos"):
+        appended = api_client.flush_consecutivos()
+    if appended:
+        progress(f"Consecutivos registrados: {appended}")
+
+
+def process_clients(
+    api_client,
+    clients,
+    results_lote,
+    results_individuals,
+    max_workers: int = 1,
+    progress=_no_progress,
+):
+    """
+    Process all the clients of a lote.
+
+    Args:
+        api_client: services.excel.Client with the lote INFO already filled
+        clients: Client (destination) names of the lote
+        results_lote: Lote body returned by INFOCGAN
+        results_individuals: Individuals body returned by INFOCGAN
+        max_workers: Clients processed at the same time. 1 keeps the
+            sequential path on the lote spreadsheet.
+        progress: Called with a short message after every finished step
+    """
+    if max_workers <= 1 or len(clients) <= 1:
+        for client in clients:
+            logger.info(f"Aprobando automáticamente cliente: {client}")
+            row_values = process_client(
+                api_client, client, results_lote, results_individuals, progress
+            )
+            if row_values:
+                api_client.append_consecutivo_row(row_values)
+        _flush_consecutivos(api_client, progress)
+        # Once for the lote, after the last row was appended
+        with metrics.timed("lote:download_consecutivos"):
+            api_client.download_consecutivos_sheet()
+        progress("Consecutivos exportado")
+        return
+
+    # Created up front so the workers don't race creating it
+    os.makedirs(f"downloads/{api_client.batch}", exist_ok=True)
+
+    workers = min(max_workers, len(clients))
+    logger.info(f"Processing {len(clients)} clients with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            metrics.submit(
+                executor,
+                _process_client_copy,
+                api_client,
+                client,
+                results_lote,
+                results_individuals,
+                progress,
+            )
+            for client in clients
+        ]
+        rows = [future.result() for future in futures]
+
+    # Queued in client order so Consecutivos ends up as in the sequential run
+    for row_values in rows:
+        if row_values:
+            api_client.append_consecutivo_row(row_values)
+    _flush_consecutivos(api_client, progress)
+    with metrics.timed("lote:download_consecutivos"):
+        api_client.download_consecutivos_sheet()
+    progress("Consecutivos exportado")
+
+
+def process_lote(
+    api_client,
+    clients,
+    results_lote,
+    results_individuals,
+    decomisos_data=None,
+    max_workers: int = 1,
+    progress=_no_progress,
+) -> dict:
+    """
+    Fill a lote on its own copy of the template and process every client.
+
+    Working on a copy keeps lotes queued by different operators from
+    overwriting each other's INFO and Decomisos sheets.
+
+    Returns:
+        dict: Batch code, processed clients and the export and Google quota
+            counters of the app, stored as the job result
+    """
+    with metrics.timed("lote:working_copy"):
+        lote_client = api_client.working_copy(results_lote["batch"])
+    try:
+        with metrics.timed("lote:fill_info"):
+            lote_client.fill_info(results_lote, results_individuals)
+        progress(f"Información del lote {lote_client.batch} diligenciada")
+
+        # Escribir decomisos a Google Sheets (una sola vez, no por cliente)
+        if decomisos_data:
+            logger.info("Escribiendo datos de decomisos a Google Sheets")
+            with metrics.timed("lote:fill_decomisos"):
+                lote_client.fill_decomisos(decomisos_data)
+            progress("Decomisos diligenciados")
+        else:
+            logger.warning("No hay datos de decomisos para escribir")
+
+        process_clients(
+            lote_client,
+            clients,
+            results_lote,
+            results_individuals,
+            max_workers=max_workers,
+            progress=progress,
+        )
+    finally:
+        with metrics.timed("lote:discard_working_copy"):
+            lote_client.discard_working_copy()
+    exports = api_client.exports.stats()
+    logger.info(
+        f"Exports performed: {exports['performed']}, saved: {exports['saved']}"
+    )
+    quota = api_client.quota.stats()
+    logger.info(
+        f"Google calls: {quota['calls']}, throttled: {quota['throttled']}, "
+        f"waited: {quota['waited']} s"
+    )
+    return {
+        "batch": lote_client.batch,
+        "clients": list(clients),
+        "exports": exports,
+        "quota": quota,
+    }
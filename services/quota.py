@@ -0,0 +1,271 @@
+"""
+Shared rate limiting of Google Sheets and Drive calls.
+
+The Sheets API allows a fixed number of read and write requests per minute
+for the service account; two operators processing lotes at the same time
+go over it and every call past the limit answers 429. QuotaScheduler keeps a
+token bucket per API and kind of call ("sheets:read", "sheets:write",
+"drive:read", "drive:write"), refilled at the per-minute quota. A call takes
+a token before it is sent and waits for one when the bucket is empty, so a
+burst is queued instead of rejected. A 429 that still gets through (another
+process on the same account, a quota lowered by Google) is retried with a
+jittered exponential backoff, and pauses the bucket so the calls queued
+behind it wait too.
+
+gspread sends every request through its HTTP client: ScheduledHTTPClient
+routes them through the scheduler. Calls made outside gspread (the PDF
+export, services.drive) go through QuotaScheduler.call. Either way the call
+is timed and counted in services.metrics under its bucket.
+
+The buckets live in the memory of one process: gunicorn workers and bulk.py
+each have their own and don't see each other's calls. The quota of the
+account has to be split between them, see per_process_limits; a 429 caused
+by another process is still retried.
+"""
+import random
+import threading
+import time
+from collections import deque
+import gspread
+from gspread.http_client import HTTPClient
+from logger_config import setup_logger
+from services import metrics
+
+logger = setup_logger()
+
+# Requests per minute of each bucket. The Sheets numbers are the per-user
+# quota of the Sheets API; Drive exports have no published limit.
+DEFAULT_LIMITS = {
+    "sheets:read": 60,
+    "sheets:write": 60,
+    "drive:read": 300,
+    "drive:write": 300,
+}
+
+READ_METHODS = {"GET", "HEAD"}
+
+
+class RateLimited(Exception):
+    """A call made outside gspread was answered with 429"""
+
+    def __init__(self, message: str, retry_after: str = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaExceeded(Exception):
+    """Google kept answering 429 after every retry"""
+
+
+def bucket_for(method: str, url: str) -> str:
+    """Bucket of a request to a Google API, e.g. "sheets:write" """
+    api = "sheets" if "sheets.googleapis.com" in url else "drive"
+    kind = "read" if method.upper() in READ_METHODS else "write"
+    return f"{api}:{kind}"
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether an error is a Google rate limit answer"""
+    if isinstance(error, RateLimited):
+        return True
+    if isinstance(error, gspread.exceptions.APIError):
+        if error.code == 429:
+            return True
+        # Drive reports some rate limits as 403
+        reasons = [e.get("reason") for e in error.error.get("errors", [])]
+        return error.code == 403 and any(
+            reason in ("rateLimitExceeded", "userRateLimitExceeded")
+            for reason in reasons
+        )
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return status is not None and int(status) == 429
+
+
+def retry_after(error: Exception) -> float:
+    """Seconds asked by the Retry-After header of a 429, None if absent"""
+    if isinstance(error, RateLimited):
+        value = error.retry_after
+    else:
+        response = getattr(error, "response", None)
+        value = response.headers.get("Retry-After") if response is not None else None
+    if value and str(value).isdigit():
+        return float(value)
+    return None
+
+
+def _size(result) -> int:
+    """Bytes returned by a call: a requests response or the exported content"""
+    if isinstance(result, bytes):
+        return len(result)
+    content = getattr(result, "content", None)
+    return len(content) if isinstance(content, bytes) else 0
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """
+        Take a token and return the seconds to wait before using it.
+
+        The count goes below zero while calls are queued, so each caller
+        gets its own slot and they are served in arrival order.
+        """
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, now: float, seconds: float):
+        """Make the next call wait at least seconds"""
+        self._refill(now)
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def per_process_limits(limits: dict, processes: int) -> dict:
+    """
+    Share of per-minute limits for each of processes schedulers using the
+    same service account, at least one call per minute.
+    """
+    processes = max(1, processes)
+    return {name: max(1, limit // processes) for name, limit in limits.items()}
+
+
+class QuotaScheduler:
+    """
+    Token buckets of one process, for every thread of it. Build it with
+    per_process_limits when several processes share the account.
+    """
+
+    def __init__(
+        self,
+        limits: dict = None,
+        retries: int = 5,
+        backoff: float = 2,
+        max_backoff: float = 64,
+    ):
+        """
+        Args:
+            limits: Requests per minute per bucket, merged over DEFAULT_LIMITS
+            retries: Extra attempts of a call answered with 429
+            backoff: Base of the exponential backoff in seconds
+            max_backoff: Upper bound of a single wait
+        """
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.buckets = {name: TokenBucket(limit) for name, limit in self.limits.items()}
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        # Send times of the last minute, per bucket
+        self._sent = {name: deque() for name in self.limits}
+        self._queued = {name: 0 for name in self.limits}
+        self.calls = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def acquire(self, bucket: str):
+        """Block until a call of the bucket may be sent"""
+        with self._lock:
+            delay = self.buckets[bucket].reserve(time.monotonic())
+            if delay > 0:
+                self._queued[bucket] += 1
+        if delay > 0:
+            time.sleep(delay)
+            metrics.observe(f"{bucket}:wait", delay)
+        with self._lock:
+            if delay > 0:
+                self._queued[bucket] -= 1
+                self.waited += delay
+            self.calls += 1
+            self._sent[bucket].append(time.monotonic())
+            self._prune(bucket, time.monotonic())
+
+    def _prune(self, bucket: str, now: float):
+        sent = self._sent[bucket]
+        while sent and sent[0] < now - 60:
+            sent.popleft()
+
+    def call(self, bucket: str, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) within the quota of the bucket, retrying it
+        when Google answers 429.
+
+        Raises:
+            QuotaExceeded: Still rate limited after the last retry
+        """
+        started = time.perf_counter()
+        result = None
+        failed = True
+        attempt = 0
+        try:
+            for attempt in range(self.retries + 1):
+                self.acquire(bucket)
+                try:
+                    result = fn(*args, **kwargs)
+                    failed = False
+                    return result
+                except Exception as e:
+                    if not is_rate_limited(e):
+                        raise
+                    with self._lock:
+                        self.throttled += 1
+                    if attempt == self.retries:
+                        raise QuotaExceeded(
+                            f"Google {bucket} quota exceeded, gave up after "
+                            f"{self.retries} retries"
+                        ) from e
+                    delay = random.uniform(
+                        0, min(self.max_backoff, self.backoff * 2**attempt)
+                    )
+                    delay = max(delay, min(self.max_backoff, retry_after(e) or 0))
+                    logger.warning(
+                        f"Google {bucket} quota exceeded, retrying in {delay:.1f} s "
+                        f"({attempt + 1}/{self.retries})"
+                    )
+                    with self._lock:
+                        self.buckets[bucket].pause(time.monotonic(), delay)
+        finally:
+            metrics.observe(bucket, time.perf_counter() - started)
+            metrics.count(
+                bucket, size=_size(result), retries=attempt, errors=int(failed)
+            )
+
+    def stats(self) -> dict:
+        """Calls sent in the last minute and queued, per bucket"""
+        with self._lock:
+            now = time.monotonic()
+            buckets = {}
+            for name, sent in self._sent.items():
+                self._prune(name, now)
+                buckets[name] = {
+                    "limit": self.limits[name],
+                    "used": len(sent),
+                    "queued": self._queued[name],
+                }
+            return {
+                "buckets": buckets,
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "waited": round(self.waited, 1),
+            }
+
+
+class ScheduledHTTPClient(HTTPClient):
+    """gspread HTTP client that sends every request through a QuotaScheduler"""
+
+    def __init__(self, auth, session=None, quota: QuotaScheduler = None):
+        super().__init__(auth, session)
+        self.quota = quota if quota is not None else QuotaScheduler()
+
+    def request(self, method: str, endpoint: str, *args, **kwargs):
+        return self.quota.call(
+            bucket_for(method, endpoint), super().request, method, endpoint, *args, **kwargs
+        )
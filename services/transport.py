@@ -0,0 +1,192 @@
+"""
+HTTP transport for the INFOCGAN API.
+
+Wraps a requests.Session with a sized connection pool, per-endpoint timeouts,
+jittered exponential retries for idempotent calls and an automatic re-login
+and replay when the API answers 401.
+"""
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from logger_config import setup_logger
+from services import metrics
+
+logger = setup_logger()
+
+# Seconds allowed per endpoint, matched by prefix of the path after the base URL
+DEFAULT_TIMEOUTS = {
+    "login": 15,
+    "batch/search": 30,
+    "batch": 30,
+    "monitoring/individuals": 60,
+    "summary/dispatch": 60,
+    "storage": 120,
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class Transport:
+    def __init__(
+        self,
+        pool_size: int = 10,
+        timeouts: dict = None,
+        default_timeout: float = 30,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10,
+        on_unauthorized=None,
+    ):
+        """
+        Args:
+            pool_size: Connections kept open per host
+            timeouts: Seconds per endpoint, merged over DEFAULT_TIMEOUTS
+            default_timeout: Seconds for endpoints without their own timeout
+            retries: Extra attempts for idempotent calls on connection errors,
+                timeouts and 429/5xx answers
+            backoff: Base of the exponential backoff in seconds
+            max_backoff: Upper bound of a single wait
+            on_unauthorized: Called on 401; returns True when it logged in
+                again and the request can be replayed
+        """
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.default_timeout = default_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_unauthorized = on_unauthorized
+        self._auth_lock = threading.Lock()
+
+    def timeout_for(self, endpoint: str) -> float:
+        # Longest matching prefix wins: "batch/search" before "batch"
+        for prefix in sorted(self.timeouts, key=len, reverse=True):
+            if endpoint and endpoint.startswith(prefix):
+                return self.timeouts[prefix]
+        return self.default_timeout
+
+    def _wait(self, attempt: int, response=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.max_backoff, int(retry_after)))
+        time.sleep(delay)
+
+    def _reauthenticate(self, sent_authorization) -> bool:
+        with self._auth_lock:
+            # Another thread already logged in again while we waited
+            if self.session.headers.get("Authorization") != sent_authorization:
+                return True
+            logger.warning("INFOCGAN answered 401, logging in again")
+            return bool(self.on_unauthorized())
+
+    def _ensure_authenticated(self):
+        with self._auth_lock:
+            if "Authorization" not in self.session.headers:
+                logger.info("Logging in to INFOCGAN before the first request")
+                self.on_unauthorized()
+
+    def _record(self, endpoint, started: float, response, retries: int, kwargs: dict):
+        metrics.observe(f"infocgan:{endpoint or 'other'}", time.perf_counter() - started)
+        size = 0
+        if response is not None:
+            # A streamed body is left for the caller to read
+            if kwargs.get("stream"):
+                size = int(response.headers.get("Content-Length") or 0)
+            else:
+                size = len(response.content)
+        metrics.count(
+            "infocgan",
+            size=size,
+            retries=retries,
+            errors=int(response is None or response.status_code >= 400),
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str = None,
+        idempotent: bool = None,
+        timeout: float = None,
+        authenticate: bool = True,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request with retries. Returns the last response; raising for
+        the status code is left to the caller. The call, its retries and the
+        bytes received are counted in services.metrics.
+
+        Args:
+            endpoint: Path used to pick the timeout, e.g. "batch/search"
+            idempotent: Whether the call may be retried, by default only
+                GET/HEAD/OPTIONS/PUT/DELETE are
+            timeout: Overrides the endpoint timeout
+            authenticate: Log in before the first request and re-login and
+                replay once on 401
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if timeout is None:
+            timeout = self.timeout_for(endpoint)
+
+        # Login is deferred to the first request that needs it
+        if authenticate and self.on_unauthorized and "Authorization" not in self.session.headers:
+            self._ensure_authenticated()
+
+        replayed = False
+        attempt = 0
+        response = None
+        started = time.perf_counter()
+        try:
+            while True:
+                sent_authorization = self.session.headers.get("Authorization")
+                try:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if not idempotent or attempt >= self.retries:
+                        raise
+                    logger.warning(f"{method} {endpoint or url} failed ({e}), retrying")
+                    self._wait(attempt)
+                    attempt += 1
+                    continue
+
+                if (
+                    response.status_code == 401
+                    and authenticate
+                    and not replayed
+                    and self.on_unauthorized
+                ):
+                    replayed = True
+                    if self._reauthenticate(sent_authorization):
+                        continue
+                    return response
+
+                if (
+                    response.status_code in RETRY_STATUSES
+                    and idempotent
+                    and attempt < self.retries
+                ):
+                    logger.warning(
+                        f"{method} {endpoint or url} answered {response.status_code}, retrying"
+                    )
+                    self._wait(attempt, response)
+                    attempt += 1
+                    continue
+
+                return response
+        finally:
+            self._record(endpoint, started, response, attempt + replayed, kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
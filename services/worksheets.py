@@ -0,0 +1,129 @@
+"""
+Cached worksheet handles of a spreadsheet.
+
+spreadsheet.worksheet(title) and spreadsheet.worksheets() each fetch the
+spreadsheet metadata. WorksheetRegistry fetches it once, indexes the tabs by
+exact and normalized title and hands out the same handles afterwards. The
+index is rebuilt when a title is missing or the Sheets API reports a range
+it cannot parse, which is how a renamed or deleted tab shows up.
+"""
+import threading
+import unicodedata
+import gspread
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+
+def normalize_title(title: str) -> str:
+    """Title without accents, surrounding spaces or case"""
+    return (
+        unicodedata.normalize("NFKD", title)
+        .encode("ascii", "ignore")
+        .decode("ascii")
+        .strip()
+        .casefold()
+    )
+
+
+def is_structure_error(error: Exception) -> bool:
+    """Whether an API error means the tabs of the spreadsheet changed"""
+    if isinstance(error, gspread.exceptions.WorksheetNotFound):
+        return True
+    if isinstance(error, gspread.exceptions.APIError):
+        message = str(error)
+        return "Unable to parse range" in message or "No grid with id" in message
+    return False
+
+
+class WorksheetRegistry:
+    def __init__(self, spreadsheet, worksheets: list = None):
+        """
+        Args:
+            spreadsheet: gspread.Spreadsheet or LocalSpreadsheet
+            worksheets: Handles already known, loaded lazily if omitted
+        """
+        self.spreadsheet = spreadsheet
+        self._lock = threading.Lock()
+        self._worksheets = None
+        self._by_title = {}
+        self._by_normalized = {}
+        self.loads = 0
+        if worksheets is not None:
+            self._index(worksheets)
+
+    def _index(self, worksheets: list):
+        self._worksheets = worksheets
+        self._by_title = {}
+        self._by_normalized = {}
+        # First tab wins on duplicates, like spreadsheet.worksheet(title)
+        for worksheet in worksheets:
+            self._by_title.setdefault(worksheet.title, worksheet)
+            self._by_normalized.setdefault(normalize_title(worksheet.title), worksheet)
+
+    def _ensure_loaded(self, reload: bool = False) -> tuple:
+        """(worksheets, by title, by normalized title) as currently indexed"""
+        with self._lock:
+            if self._worksheets is None or reload:
+                self._index(self.spreadsheet.worksheets())
+                self.loads += 1
+            return self._worksheets, self._by_title, self._by_normalized
+
+    def invalidate(self):
+        with self._lock:
+            self._worksheets = None
+        logger.info(f"Worksheet metadata of {self.spreadsheet.id} invalidated")
+
+    def rebind(self, spreadsheet):
+        """
+        Registry for a Drive copy of this spreadsheet.
+
+        A copy keeps the titles and sheet ids of its tabs, so the handles are
+        rebuilt from this registry's metadata (loaded now if needed, once for
+        all the copies) instead of fetched for every copy.
+        """
+        if not isinstance(spreadsheet, gspread.Spreadsheet):
+            return WorksheetRegistry(spreadsheet)
+        worksheets = self._ensure_loaded()[0]
+        return WorksheetRegistry(
+            spreadsheet,
+            [
+                gspread.Worksheet(
+                    spreadsheet,
+                    dict(worksheet._properties),
+                    spreadsheet.id,
+                    spreadsheet.client,
+                )
+                for worksheet in worksheets
+            ],
+        )
+
+    def worksheets(self) -> list:
+        return list(self._ensure_loaded()[0])
+
+    def get(self, title: str):
+        """Handle of the tab with this exact title"""
+        return self.find([title], exact=True)
+
+    def find(self, preferred_titles: list, exact: bool = False):
+        """
+        Handle of the first title that exists, compared after normalization
+        unless exact is set. Reloads the metadata once before giving up.
+
+        Raises:
+            gspread.exceptions.WorksheetNotFound
+        """
+        for reload in (False, True):
+            worksheets, by_title, by_normalized = self._ensure_loaded(reload)
+            for title in preferred_titles:
+                if exact:
+                    worksheet = by_title.get(title)
+                else:
+                    worksheet = by_normalized.get(normalize_title(title))
+                if worksheet:
+                    return worksheet
+
+        available_titles = [worksheet.title for worksheet in worksheets]
+        raise gspread.exceptions.WorksheetNotFound(
+            f"Worksheet not found. Tried: {preferred_titles}. Available: {available_titles}"
+        )
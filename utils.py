@@ -1,135 +1,370 @@
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from PyPDF2 import PdfReader, PdfWriter
 from openpyxl import load_workbook
+from openpyxl.cell.read_only import EmptyCell
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import landscape, portrait, A0, A1, A2, A3, A4
+from reportlab.lib.pagesizes import landscape, A4
 from reportlab.lib.colors import Color, black
-from reportlab.lib.units import inch
-from openpyxl.styles import NamedStyle, Font
-from openpyxl.cell.cell import Cell
-
-
-def get_page_size(num_columns, num_rows):
-    if num_columns <= 10 and num_rows <= 50:
-        return A4
-    elif num_columns <= 20 and num_rows <= 100:
-        return A3
-    elif num_columns <= 40 and num_rows <= 200:
-        return A2
-    elif num_columns <= 80 and num_rows <= 400:
-        return A1
-    elif num_columns > 80 or num_rows > 400:
-        return A0
-    else:
-        return A4
+
+
+# Every page has this size; sheets larger than a page are split over several
+PAGE_SIZE = landscape(A4)
+PAGE_MARGIN = 20
+# Wide sheets are shrunk down to this scale before columns are split in bands
+MIN_SCALE = 0.5
 
 
 def hex_to_rgb(hex_color):
     return tuple(int(hex_color[i : i + 2], 16) for i in (0, 2, 4))
 
 
-def get_cell_value(cell):
-    if cell.value is None:
+def format_value(value, data_type):
+    """Text drawn for a cell, same rules as get_cell_value"""
+    if value is None:
         return ""
-    elif cell.data_type == "n":
-        return str(cell.value)
-    elif cell.data_type == "s":
-        return cell.value
-    elif cell.data_type == "b":
-        return "TRUE" if cell.value else "FALSE"
-    elif cell.data_type == "d":
-        return cell.value.strftime("%Y-%m-%d")
-    elif cell.data_type == "e":
-        return f"ERROR: {cell.value}"
-    elif cell.data_type == "t":
-        return cell.value.strftime("%H:%M:%S")
+    elif data_type == "n":
+        return str(value)
+    elif data_type == "s":
+        return value
+    elif data_type == "b":
+        return "TRUE" if value else "FALSE"
+    elif data_type == "d":
+        if isinstance(value, datetime.time):
+            return value.strftime("%H:%M:%S")
+        if isinstance(value, datetime.timedelta):
+            return str(value)
+        return value.strftime("%Y-%m-%d")
+    elif data_type == "e":
+        return f"ERROR: {value}"
     else:
-        return str(cell.value)
+        return str(value)
+
+
+def get_cell_value(cell):
+    return format_value(cell.value, cell.data_type)
+
+
+def fill_hex_color(fill):
+    """RRGGBB of an explicit rgb background colour, None otherwise"""
+    color = getattr(fill, "bgColor", None)
+    if color is None or color.auto or color.type != "rgb":
+        return None
+    # openpyxl keeps it as ARGB, e.g. "FF00B050"
+    hex_color = str(color.rgb)[-6:]
+    if len(hex_color) != 6:
+        return None
+    return hex_color
+
+
+def cell_style(font, fill) -> tuple:
+    """(font size, fill rgb) drawn for a cell"""
+    hex_color = fill_hex_color(fill)
+    return (font.sz or 12, hex_to_rgb(hex_color) if hex_color else None)
+
+
+class StyleCache:
+    """
+    (font size, fill rgb) per cell style of a read-only workbook.
+
+    Read-only cells share the font and fill objects of their workbook, so
+    the pair is looked up once per style instead of once per cell.
+    """
+
+    # Cells without a style: openpyxl's default font, no fill
+    DEFAULT = (11, None)
+
+    def __init__(self):
+        # (id(font), id(fill)) -> (font, fill, style), the objects are kept
+        # so their ids are not reused
+        self._by_objects = {}
+
+    def of_cell(self, cell) -> tuple:
+        font, fill = cell.font, cell.fill
+        key = (id(font), id(fill))
+        entry = self._by_objects.get(key)
+        if entry is None:
+            entry = self._by_objects[key] = (font, fill, cell_style(font, fill))
+        return entry[2]
+
+
+def _sheet_rows(sheet, styles: StyleCache):
+    """(row number, [(column, value, data type, style)]) of every used row"""
+    # The <dimension> tag of the file may not cover every cell
+    sheet.reset_dimensions()
+    for row in sheet.iter_rows():
+        cells = [cell for cell in row if not isinstance(cell, EmptyCell)]
+        if not cells:
+            continue
+        yield (
+            cells[0].row,
+            [
+                (
+                    cell.column,
+                    cell.value,
+                    cell.data_type,
+                    styles.of_cell(cell) if cell.has_style else None,
+                )
+                for cell in cells
+            ],
+        )
 
 
-def excel_to_pdf(excel_file, pdf_file):
-    workbook = load_workbook(excel_file, data_only=True)
-    c = canvas.Canvas(pdf_file)
+def read_sheet(sheet, styles: StyleCache) -> dict:
+    """
+    Stream a read-only worksheet once and keep only what is drawn.
 
-    for sheet_index, sheet in enumerate(workbook.worksheets):
-        num_columns = len(sheet[1])
-        num_rows = len(list(sheet.iter_rows()))
-        page_size = get_page_size(num_columns, num_rows)
-        c.setPageSize(page_size)
+    Column widths are accumulated while the rows go by; the rows themselves
+    are reduced to their text and a shared style tuple per cell, so no
+    openpyxl cell object outlives its row. Read-only worksheets don't expose
+    row heights, every row gets the default one.
 
-        if sheet_index > 0:
-            c.showPage()
+    Returns:
+        dict: {"rows": [(row number, height, texts, styles)], "first_row",
+            "column_widths", "num_rows", "num_columns"}
+    """
+    widths = {}
+    rows = []
+    first_row = None
+    last_row = 0
+    last_column = 0
+    for row_number, cells in _sheet_rows(sheet, styles):
+        if first_row is None:
+            first_row = row_number
+        last_row = row_number
+        texts = {}
+        cell_styles = {}
+        for column, value, data_type, style in cells:
+            last_column = max(last_column, column)
+            width = len(str(value or "")) * 6
+            if width > widths.get(column, 0):
+                widths[column] = width
+            if value is not None:
+                texts[column] = format_value(value, data_type)
+            if style:
+                cell_styles[column] = style
+        if not texts:
+            continue
+        rows.append((row_number, None, texts, cell_styles))
 
-        page_width, page_height = page_size
+    num_columns = last_column
+    num_rows = last_row
+    column_widths = [
+        max(70, widths.get(column, 0)) + 10 for column in range(1, num_columns + 1)
+    ]
+    # Rows only hold the cells present in the file; pad them to num_columns
+    rows = [
+        (
+            row_number,
+            height,
+            [texts.get(column, "") for column in range(1, num_columns + 1)],
+            [
+                cell_styles.get(column, StyleCache.DEFAULT)
+                for column in range(1, num_columns + 1)
+            ],
+        )
+        for row_number, height, texts, cell_styles in rows
+    ]
+    return {
+        "rows": rows,
+        "first_row": first_row,
+        "column_widths": column_widths,
+        "num_rows": num_rows,
+        "num_columns": num_columns,
+    }
 
-        column_widths = [
-            max(70, max(len(str(cell.value or "")) for cell in col) * 6) + 10
-            for col in sheet.iter_cols()
-        ]
 
-        if len(column_widths) < num_columns:
-            column_widths += [70] * (num_columns - len(column_widths))
+def _column_bands(column_widths: list, max_width: float) -> list:
+    """Split column indexes into consecutive groups no wider than max_width"""
+    bands = []
+    band = []
+    band_width = 0
+    for index, width in enumerate(column_widths):
+        if band and band_width + width > max_width:
+            bands.append(band)
+            band = []
+            band_width = 0
+        band.append(index)
+        band_width += width
+    if band:
+        bands.append(band)
+    return bands
 
-        total_width = sum(column_widths)
-        scale_factor = page_width / total_width
-        column_widths = [width * scale_factor for width in column_widths]
 
-        space_between_columns = [width * 0.1 for width in column_widths]
-        column_widths = [
-            width + space for width, space in zip(column_widths, space_between_columns)
-        ]
+def _row_chunks(rows: list, header, max_height: float) -> list:
+    """Split rows into pages whose height, header included, fits max_height"""
+    header_height = header[0] if header else 0
+    chunks = []
+    chunk = []
+    chunk_height = header_height
+    for row in rows:
+        # A row taller than a page still gets one page of its own
+        if chunk and chunk_height + row[0] > max_height:
+            chunks.append(chunk)
+            chunk = []
+            chunk_height = header_height
+        chunk.append(row)
+        chunk_height += row[0]
+    if chunk:
+        chunks.append(chunk)
+    return chunks
 
-        y = page_height
-        rows = list(sheet.iter_rows())
 
-        for index, row in enumerate(rows):
-            if all(cell.value is None for cell in row):
-                continue
+def layout_pages(data: dict, page_size=PAGE_SIZE, margin: float = PAGE_MARGIN) -> list:
+    """
+    Split a read_sheet() result into fixed-size pages.
 
-            x = 0
-            row_height = (
-                max(sheet.row_dimensions[cell.row].height or 20 for cell in row)
-                * 1.33333
+    The sheet is shrunk to fit the page width, down to MIN_SCALE; beyond
+    that its columns are split into bands. The first used row is repeated
+    at the top of every page. Pages go down the rows of a band, then on to
+    the next band, like Excel prints.
+
+    Returns:
+        list: Self-contained page dicts for render_page
+    """
+    page_width, page_height = page_size
+    # Same column sizing as before: content width plus 10% spacing
+    column_widths = [width * 1.1 for width in data["column_widths"]]
+    total_width = sum(column_widths) or 1
+    scale = max(MIN_SCALE, min(1, (page_width - 2 * margin) / total_width))
+    max_width = (page_width - 2 * margin) / scale
+    max_height = (page_height - 2 * margin) / scale
+
+    rows = []
+    header = None
+    for row_number, height, texts, cell_styles in data["rows"]:
+        row_height = (height or 20) * 1.33333
+        if row_number == data["first_row"]:
+            header = (row_height * 2, texts, cell_styles)
+            continue
+        rows.append((row_height, texts, cell_styles))
+
+    pages = []
+    for band in _column_bands(column_widths, max_width):
+        first, last = band[0], band[-1] + 1
+        for chunk in _row_chunks(rows, header, max_height) or [[]]:
+            page_rows = [header] + chunk if header else chunk
+            pages.append(
+                {
+                    "size": page_size,
+                    "margin": margin,
+                    "scale": scale,
+                    "column_widths": column_widths[first:last],
+                    "rows": [
+                        (height, texts[first:last], cell_styles[first:last])
+                        for height, texts, cell_styles in page_rows
+                    ],
+                }
             )
-            if index == 0:
-                row_height *= 2
-
-            column_index = 0
-            for cell in row:
-                cell_width = column_widths[column_index]
-
-                hex_color = None
-                if cell.fill.bgColor:
-                    color = cell.fill.bgColor
-                    if color.auto:
-                        pass
-                    elif color.indexed is not None:
-                        pass
-                    elif color.type == "rgb":
-                        hex_color = "{:02x}{:02x}{:02x}".format(
-                            color.rgb.r, color.rgb.g, color.rgb.b
-                        )
-
-                if hex_color and len(hex_color) == 6:
-                    rgb = hex_to_rgb(hex_color)
-                    c.setFillColor(Color(rgb[0] / 255, rgb[1] / 255, rgb[2] / 255))
-                    c.rect(x, y, cell_width, row_height, fill=1)
-
-                text_object = c.beginText(x + 5, y - row_height + 10)
+    return pages
+
+
+def render_page(page: dict) -> bytes:
+    """Draw one page of layout_pages() as a single-page PDF"""
+    buffer = BytesIO()
+    page_width, page_height = page["size"]
+    c = canvas.Canvas(buffer, pagesize=page["size"])
+    margin = page["margin"]
+    scale = page["scale"]
+    c.translate(margin, page_height - margin)
+    c.scale(scale, scale)
+
+    # Canvas state only changes when a cell needs something different
+    c.setStrokeColor(black)
+    c.setFillColor(black)
+    current_font_size = None
+
+    y = 0
+    for row_height, texts, cell_styles in page["rows"]:
+        x = 0
+        for cell_width, text, (font_size, rgb) in zip(
+            page["column_widths"], texts, cell_styles
+        ):
+            if rgb:
+                c.setFillColor(Color(rgb[0] / 255, rgb[1] / 255, rgb[2] / 255))
+                c.rect(x, y - row_height, cell_width, row_height, fill=1)
                 c.setFillColor(black)
 
-                text_object.setFont("Helvetica", cell.font.sz or 12)
-                text_object.textLine(get_cell_value(cell))
-                c.drawText(text_object)
+            if text:
+                if font_size != current_font_size:
+                    c.setFont("Helvetica", font_size)
+                    current_font_size = font_size
+                c.drawString(x + 5, y - row_height + 10, text)
 
-                c.setStrokeColor(black)
-                c.rect(x, y - row_height, cell_width, row_height)
+            c.rect(x, y - row_height, cell_width, row_height)
 
-                x += cell_width
-                column_index += 1
+            x += cell_width
 
-            y -= row_height
+        y -= row_height
 
+    c.showPage()
     c.save()
+    return buffer.getvalue()
+
+
+def write_pages(pages: list, pdf_file, page_size=PAGE_SIZE, workers: int = 1):
+    """
+    Render pages of layout_pages() and write them to pdf_file in order.
+
+    Args:
+        pages: Page dicts, possibly of several sheets
+        pdf_file: Path or file object the PDF is written to
+        page_size: Size of the blank page written when there are no pages
+        workers: Processes rendering pages at the same time
+    """
+    writer = PdfWriter()
+    if workers > 1 and len(pages) > 1:
+        # spawn: forking a process that runs Flask worker threads is unsafe
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            for content in executor.map(render_page, pages, chunksize=4):
+                writer.add_page(PdfReader(BytesIO(content)).pages[0])
+    else:
+        for page in pages:
+            writer.add_page(PdfReader(BytesIO(render_page(page))).pages[0])
+
+    if not pages:
+        writer.add_blank_page(*page_size)
+    writer.write(pdf_file)
+
+
+def excel_to_pdf(
+    excel_file, pdf_file, sheet_names=None, page_size=PAGE_SIZE, workers: int = 1
+):
+    """
+    Draw worksheets of an Excel file as a paginated PDF table.
+
+    The workbook is opened in read-only mode and each sheet is read in a
+    single streaming pass (see read_sheet), so memory follows the text of
+    the sheet rather than openpyxl's per-cell objects. Each page is then
+    rendered on its own and appended to the output as soon as it is ready.
+
+    Args:
+        excel_file: Path or file object of the .xlsx
+        pdf_file: Path or file object the PDF is written to
+        sheet_names: Sheets to draw, all of them by default
+        page_size: (width, height) in points of every page
+        workers: Processes rendering pages at the same time, 1 renders in
+            the calling thread
+    """
+    workbook = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        styles = StyleCache()
+        worksheets = (
+            [workbook[name] for name in sheet_names]
+            if sheet_names
+            else workbook.worksheets
+        )
+        pages = []
+        for sheet in worksheets:
+            pages.extend(layout_pages(read_sheet(sheet, styles), page_size))
+    finally:
+        workbook.close()
+
+    write_pages(pages, pdf_file, page_size, workers)
 
 
 def extract_pdf_pages(input_pdf: str, output_pdf: str, pages: list[int]):